@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+
+# Records, for every generated artifact, the hashes of the inputs and
+# parameters it was built from. An output is rebuilt only when one changes.
+MANIFEST_FILE = os.path.abspath(".cache/build_manifest.json")
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+def params_hash(params):
+    blob = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+class BuildManifest:
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.data = {"files": {}, "outputs": {}}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+
+    def hash_file(self, path):
+        # Reuses the stored hash while size and mtime are unchanged, so large
+        # inputs such as podcast.mp3 are only re-read after they are modified
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        entry = self.data["files"].get(path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["sha256"]
+        digest = file_hash(path)
+        self.data["files"][path] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+        return digest
+
+    def fingerprint(self, inputs, params):
+        return {
+            "inputs": {os.path.abspath(p): self.hash_file(p) for p in inputs},
+            "params": params_hash(params)
+        }
+
+    def is_fresh(self, output, inputs, params):
+        output = os.path.abspath(output)
+        entry = self.data["outputs"].get(output)
+        if not entry or not os.path.exists(output):
+            return False
+        if entry["fingerprint"] != self.fingerprint(inputs, params):
+            return False
+        return entry["sha256"] == self.hash_file(output)
+
+    def record(self, output, inputs, params):
+        output = os.path.abspath(output)
+        self.data["outputs"][output] = {
+            "fingerprint": self.fingerprint(inputs, params),
+            "sha256": self.hash_file(output)
+        }
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+import unicodedata
+from functools import partial
+
+import metrics
+from context_index import tokenize
+from minimax_client import (DEFAULT_CONCURRENCY, ROUTE_SETTINGS, MiniMaxClient, build_t2a_payload, thread_pool,
+                            voice_for)
+from tts_cache import TTSCache
+from tts_jobs import TokenBucket
+
+# Replays logged interactions into the TTS cache. Queries from the request
+# log and the API debug log are grouped into near-duplicates per insertion
+# point, ranked by how often they were asked, and the dialogue lines of the
+# most popular groups are synthesized ahead of time. The interact route
+# only reads this cache when it delegates to synthesis_service.py
+# (SYNTHESIS_SERVICE_URL); otherwise it calls MiniMax directly.
+REQUEST_LOG = "requests.jsonl"
+DEBUG_LOG = "api-debug.log"
+SIMILARITY = 0.6 # Bigram Jaccard similarity for two queries to count as one
+DEFAULT_RPM = 60
+DEFAULT_MAX_CHARS = 20000 # t2a is billed per character
+
+LOG_SEPARATOR = "\n" + "=" * 80 + "\n"
+QUERY_LINE = re.compile(r"Generating dialogue for: (.*)")
+FINAL_DIALOGUE_LINE = re.compile(r"Final dialogue: (\[.*\])")
+SCRIPT_SECTION = re.compile(r"\*\*F、剧本\*\*\n(.*?)\n\n---", re.S)
+CONTEXT_SECTION = re.compile(r"\*\*A、上下文\*\*\n(.*?)\n\n\*\*", re.S)
+
+def normalize_query(query):
+    text = unicodedata.normalize("NFKC", query).lower()
+    return "".join(ch for ch in text if ch.isalnum())
+
+def anchor(context_before):
+    # The transcript line right before the insertion point
+    lines = [line.strip() for line in (context_before or "").splitlines() if line.strip()]
+    return lines[-1] if lines else ""
+
+def iter_request_log(path=REQUEST_LOG):
+    # Records written by the interact route; other JSON lines are skipped
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(rec, dict) or not rec.get("userQuery"):
+                continue
+            yield {
+                "query": rec["userQuery"],
+                "anchor": anchor(rec.get("contextBefore")),
+                "dialogue": rec.get("dialogue") or [],
+                "at": rec.get("at", "")
+            }
+
+def _parse_dialogue(text):
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return []
+    if isinstance(value, dict):
+        value = value.get("dialogue", [])
+    return [line for line in value if isinstance(line, dict) and line.get("content")]
+
+def iter_debug_log(path=DEBUG_LOG):
+    # [GENERATE DIALOGUE] blocks of api-debug.log. Older entries have no
+    # final dialogue line, so the script from the polish prompt is used.
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        blocks = f.read().split(LOG_SEPARATOR)
+    for block in blocks:
+        if "[GENERATE DIALOGUE]" not in block:
+            continue
+        query = QUERY_LINE.search(block)
+        if not query:
+            continue
+        final = FINAL_DIALOGUE_LINE.search(block)
+        script = SCRIPT_SECTION.search(block)
+        dialogue = _parse_dialogue(final.group(1)) if final else []
+        if not dialogue and script:
+            dialogue = _parse_dialogue(script.group(1))
+        context = CONTEXT_SECTION.search(block)
+        before = context.group(1).split("[INSERT HERE]")[0] if context else ""
+        yield {
+            "query": query.group(1).strip(),
+            "anchor": anchor(before),
+            "dialogue": dialogue,
+            "at": block.lstrip().split("\n", 1)[0].strip("[]")
+        }
+
+def similarity(a, b):
+    if a == b:
+        return 1.0
+    ta, tb = set(tokenize(a)), set(tokenize(b))
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+def rank(records, threshold=SIMILARITY):
+    # Groups near-duplicate queries asked at the same insertion point,
+    # most frequent group first. Each group keeps its latest dialogue.
+    groups = []
+    by_anchor = {}
+    for rec in sorted(records, key=lambda r: r["at"]):
+        norm = normalize_query(rec["query"])
+        group = None
+        for candidate in by_anchor.get(rec["anchor"], []):
+            if similarity(norm, candidate["norm"]) >= threshold:
+                group = candidate
+                break
+        if group is None:
+            group = {"norm": norm, "query": rec["query"], "anchor": rec["anchor"],
+                     "count": 0, "variants": set(), "dialogue": []}
+            groups.append(group)
+            by_anchor.setdefault(rec["anchor"], []).append(group)
+        group["count"] += 1
+        group["variants"].add(rec["query"])
+        if rec["dialogue"]:
+            group["dialogue"] = rec["dialogue"]
+    groups.sort(key=lambda g: g["count"], reverse=True)
+    return groups
+
+def plan(groups, cache, max_chars=DEFAULT_MAX_CHARS, max_requests=None, min_count=1):
+    # Uncached lines of the top groups, deduplicated, within the budget
+    items = []
+    seen = set()
+    chars = 0
+    for group in groups:
+        if group["count"] < min_count:
+            break
+        for line in group["dialogue"]:
+            settings = {"voice_id": voice_for(line.get("speaker", "")), **ROUTE_SETTINGS}
+            key = cache.key(build_t2a_payload(line["content"], **settings))
+            if key in seen or os.path.exists(cache.path(key)):
+                continue
+            if chars + len(line["content"]) > max_chars or (max_requests and len(items) >= max_requests):
+                return items
+            seen.add(key)
+            chars += len(line["content"])
+            items.append({"text": line["content"], "query": group["query"], "count": group["count"], **settings})
+    return items
+
+async def warm_items(client, items, concurrency=DEFAULT_CONCURRENCY, rpm=DEFAULT_RPM):
+    bucket = TokenBucket(rpm, burst=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    pool = thread_pool(concurrency)
+    results = {"done": 0, "failed": 0}
+
+    async def run(item):
+        settings = {k: v for k, v in item.items() if k not in ("text", "query", "count")}
+        async with semaphore:
+            await bucket.acquire()
+            try:
+                await loop.run_in_executor(pool, partial(client.t2a, item["text"], **settings))
+            except Exception as e:
+                results["failed"] += 1
+                print(f"Failed '{item['text'][:20]}': {e}")
+                return
+            results["done"] += 1
+            print(f"[{results['done']}/{len(items)}] x{item['count']} {item['query'][:30]}: {item['text'][:30]}")
+
+    try:
+        await asyncio.gather(*(run(item) for item in items))
+    finally:
+        pool.shutdown(wait=False)
+    return results
+
+def warm(request_log=REQUEST_LOG, debug_log=DEBUG_LOG, client=None, cache=None, concurrency=DEFAULT_CONCURRENCY,
+         rpm=DEFAULT_RPM, max_chars=DEFAULT_MAX_CHARS, max_requests=None, min_count=1, dry_run=False):
+    # The route writes every interaction to both logs, so the debug log only
+    # contributes what predates the request log
+    logged = list(iter_request_log(request_log))
+    cutoff = min((r["at"] for r in logged), default=None)
+    records = [*logged, *(r for r in iter_debug_log(debug_log) if cutoff is None or r["at"] < cutoff)]
+    groups = rank(records)
+    cache = cache or (client.cache if client is not None and client.cache is not None else TTSCache())
+    items = plan(groups, cache, max_chars, max_requests, min_count)
+    print(f"{len(records)} logged queries in {len(groups)} groups; "
+          f"{len(items)} uncached lines ({sum(len(i['text']) for i in items)} chars) to synthesize")
+    if dry_run or not items:
+        for item in items:
+            print(json.dumps(item, ensure_ascii=False))
+        return {"done": 0, "failed": 0, "planned": len(items)}
+
+    if client is None:
+        client = MiniMaxClient(cache=cache)
+    start = time.perf_counter()
+    results = asyncio.run(warm_items(client, items, concurrency, rpm))
+    results["planned"] = len(items)
+    print(f"Warmed {results['done']}/{len(items)} lines in {time.perf_counter() - start:.1f}s")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-synthesize popular logged interactions into the TTS cache")
+    parser.add_argument("--request-log", default=REQUEST_LOG)
+    parser.add_argument("--debug-log", default=DEBUG_LOG)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=DEFAULT_RPM, help="Requests per minute")
+    parser.add_argument("--max-chars", type=int, default=DEFAULT_MAX_CHARS, help="Character budget for this run")
+    parser.add_argument("--max-requests", type=int, default=None, help="Request budget for this run")
+    parser.add_argument("--min-count", type=int, default=1, help="Only warm queries asked at least this often")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the planned lines")
+    args = parser.parse_args()
+
+    warm(args.request_log, args.debug_log, concurrency=args.concurrency, rpm=args.rpm, max_chars=args.max_chars,
+         max_requests=args.max_requests, min_count=args.min_count, dry_run=args.dry_run)
+
+if __name__ == "__main__":
+    with metrics.run("cache_warmer"):
+        main()
@@ -0,0 +1,135 @@
+import asyncio
+import re
+import time
+from functools import partial
+
+import metrics
+from minimax_client import DEFAULT_CONCURRENCY, thread_pool
+from mp3_frames import concat, duration as mp3_duration
+
+# Long texts split at sentence punctuation, synthesized concurrently and
+# joined at MP3 frame boundaries. The joins are not sample-gapless: each one
+# keeps up to a frame of the chunks' encoder delay and padding (see concat).
+# Bracket tags such as [laugh] stay with the sentence they precede. Each
+# chunk is voiced on its own, so intonation does not carry across chunk
+# joins; a short first chunk keeps the time to first audio low.
+SENTENCE_END = "。！？!?；;…"
+CLOSERS = "”’」』）)\"'"
+MIN_CHUNK_CHARS = 24   # Shorter sentences are merged with the next one
+MAX_CHUNK_CHARS = 120  # Longer sentences are split again at commas
+FIRST_CHUNK_CHARS = 8  # The first chunk closes at the first sentence end past this
+COMMAS = "，,、："
+
+TAG = re.compile(r"\[[^\[\]]*\]|【[^【】]*】")
+
+def _sentences(text):
+    # Sentences with their end punctuation and closing quotes; tags are
+    # opaque, so punctuation inside a tag never ends a sentence
+    sentences = []
+    current = ""
+    i = 0
+    while i < len(text):
+        m = TAG.match(text, i)
+        if m:
+            current += m.group(0)
+            i = m.end()
+            continue
+        ch = text[i]
+        current += ch
+        i += 1
+        if ch in SENTENCE_END or ch == "\n":
+            while i < len(text) and (text[i] in SENTENCE_END or text[i] in CLOSERS):
+                current += text[i]
+                i += 1
+            if current.strip():
+                sentences.append(current.strip())
+            current = ""
+    if current.strip():
+        sentences.append(current.strip())
+    return sentences
+
+def _split_long(sentence, max_chars):
+    # Cuts an over-long sentence at commas outside tags
+    parts = []
+    while len(sentence) > max_chars:
+        protected = [(m.start(), m.end()) for m in TAG.finditer(sentence)]
+        cut = -1
+        for pos in range(min(len(sentence), max_chars) - 1, 0, -1):
+            if sentence[pos] in COMMAS and not any(a <= pos < b for a, b in protected):
+                cut = pos + 1
+                break
+        if cut <= 0:
+            break
+        parts.append(sentence[:cut])
+        sentence = sentence[cut:]
+    parts.append(sentence)
+    return parts
+
+def split_text(text, min_chars=MIN_CHUNK_CHARS, max_chars=MAX_CHUNK_CHARS, first_chars=FIRST_CHUNK_CHARS):
+    pieces = [p for s in _sentences(text) for p in _split_long(s, max_chars)]
+    chunks = []
+    current = ""
+    for piece in pieces:
+        limit = first_chars if not chunks else min_chars
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+        if len(TAG.sub("", current)) >= limit:
+            chunks.append(current)
+            current = ""
+    if current:
+        if chunks and (len(current) < min_chars and len(chunks[-1]) + len(current) <= max_chars):
+            chunks[-1] += current # A trailing fragment joins the previous chunk
+        else:
+            chunks.append(current)
+    return chunks
+
+async def iter_chunks(client, chunks, concurrency=DEFAULT_CONCURRENCY, **settings):
+    # Synthesizes every chunk at once (bounded) and yields (index, audio) in
+    # order, each as soon as it and all chunks before it are done
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    pool = thread_pool(concurrency)
+
+    async def run(text):
+        async with semaphore:
+            return await loop.run_in_executor(pool, partial(client.t2a, text, **settings))
+
+    tasks = [asyncio.ensure_future(run(text)) for text in chunks]
+    try:
+        for i, task in enumerate(tasks):
+            yield i, await task
+    finally:
+        for task in tasks:
+            task.cancel()
+        pool.shutdown(wait=False)
+
+async def synthesize_chunked(client, text, on_chunk=None, concurrency=DEFAULT_CONCURRENCY, **settings):
+    # Returns (stitched MP3 bytes, stats). on_chunk(index, audio) sees every
+    # chunk in order, the first one as soon as it is ready.
+    settings.pop("stream", None)
+    chunks = split_text(text)
+    if not chunks:
+        raise ValueError("No text to synthesize")
+    start = time.perf_counter()
+    parts = []
+    ttfa = None
+    with metrics.span("t2a_chunked", chars=len(text), chunks=len(chunks)) as span:
+        async for i, audio in iter_chunks(client, chunks, concurrency, **settings):
+            if ttfa is None:
+                ttfa = time.perf_counter() - start
+            parts.append(audio)
+            if on_chunk:
+                on_chunk(i, audio)
+        audio = concat(parts) if len(parts) > 1 else parts[0]
+        span.add_bytes(len(audio))
+        span.set(ttfa=ttfa)
+    return audio, {"chunks": len(chunks), "ttfa": ttfa, "total": time.perf_counter() - start,
+                   "duration": mp3_duration(audio)}
+
+def synthesize_to_file(client, text, output_filename, on_chunk=None, **settings):
+    audio, stats = asyncio.run(synthesize_chunked(client, text, on_chunk, **settings))
+    with open(output_filename, "wb") as f:
+        f.write(audio)
+    return stats
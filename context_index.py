@@ -0,0 +1,211 @@
+import argparse
+import json
+import math
+import os
+import re
+from array import array
+from collections import Counter
+
+from transcript_index import TRANSCRIPT_FILE, TranscriptIndex
+
+REFERENCE_FILES = ["播客大纲.txt", "对话人信息.txt"]
+INDEX_FILE = os.path.abspath(".cache/context_index.json")
+MAX_PASSAGE_CHARS = 300 # Reference documents are split into passages of about this size
+DEFAULT_TOP_K = 8
+DEFAULT_TOKEN_BUDGET = 1500
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+CJK_RUN = re.compile(r'[㐀-鿿豈-﫿]+')
+WORD = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    # Character bigrams for Chinese (single characters for one-character
+    # runs), lowercase words for everything else
+    text = text.lower()
+    tokens = []
+    for run in CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    tokens.extend(WORD.findall(CJK_RUN.sub(' ', text)))
+    return tokens
+
+def estimate_tokens(text):
+    # Roughly one LLM token per Chinese character and per four other characters
+    cjk = sum(len(run) for run in CJK_RUN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+def split_passages(text, max_chars=MAX_PASSAGE_CHARS):
+    # Paragraphs, merged while short and cut at sentence ends while long
+    passages = []
+    current = ""
+    for para in (p.strip() for p in re.split(r'\n\s*\n|\n', text)):
+        if not para:
+            continue
+        while len(para) > max_chars:
+            cut = max(para.rfind(ch, 0, max_chars) for ch in "。！？；.!?;")
+            cut = cut + 1 if cut > 0 else max_chars
+            if current:
+                passages.append(current)
+                current = ""
+            passages.append(para[:cut])
+            para = para[cut:].strip()
+        if current and len(current) + len(para) + 1 > max_chars:
+            passages.append(current)
+            current = ""
+        current = f"{current}\n{para}" if current else para
+    if current:
+        passages.append(current)
+    return passages
+
+def load_passages(transcript_file=TRANSCRIPT_FILE, reference_files=REFERENCE_FILES):
+    passages = []
+    if os.path.exists(transcript_file):
+        transcript = TranscriptIndex.load(transcript_file)
+        for i in range(len(transcript)):
+            passages.append({
+                "source": "transcript",
+                "index": i,
+                "seconds": int(transcript.starts[i]),
+                "text": f"【{transcript.timestamps[i]}】{transcript.speaker(i)}: {transcript.contents[i]}"
+            })
+    for path in reference_files:
+        if not os.path.exists(path):
+            print(f"Reference file not found, skipping: {path}")
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for i, text in enumerate(split_passages(f.read())):
+                passages.append({"source": os.path.basename(path), "index": i, "text": text})
+    return passages
+
+def source_fingerprint(paths):
+    # Lists rather than tuples so it compares equal after a JSON round trip
+    return [[p, os.path.getsize(p), os.stat(p).st_mtime_ns] for p in paths if os.path.exists(p)]
+
+class ContextIndex:
+    # Inverted index of character bigrams with BM25 scoring. Postings are
+    # stored as parallel arrays of passage IDs and term frequencies.
+
+    def __init__(self, passages):
+        self.passages = passages
+        self.doc_lengths = array('I')
+        self.postings = {}
+
+        for doc_id, passage in enumerate(passages):
+            counts = Counter(tokenize(passage["text"]))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = (array('I'), array('H'))
+                posting[0].append(doc_id)
+                posting[1].append(min(tf, 0xFFFF))
+        self._weigh()
+
+    def _weigh(self):
+        n = len(self.passages)
+        self.avg_length = (sum(self.doc_lengths) / n) if n else 0.0
+        self.idf = {
+            term: math.log(1 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+            for term, (ids, _) in self.postings.items()
+        }
+
+    @classmethod
+    def build(cls, transcript_file=TRANSCRIPT_FILE, reference_files=REFERENCE_FILES):
+        index = cls(load_passages(transcript_file, reference_files))
+        index.fingerprint = source_fingerprint([transcript_file, *reference_files])
+        return index
+
+    @classmethod
+    def load(cls, index_file=INDEX_FILE, transcript_file=TRANSCRIPT_FILE, reference_files=REFERENCE_FILES):
+        # Loads the saved index, rebuilding it if any source file changed
+        fingerprint = source_fingerprint([transcript_file, *reference_files])
+        if os.path.exists(index_file):
+            with open(index_file, 'r', encoding='utf-8') as f:
+                try:
+                    state = json.load(f)
+                except ValueError:
+                    state = {} # A file cut short by a crash
+            if state.get("fingerprint") == fingerprint:
+                index = cls.__new__(cls)
+                index.fingerprint = fingerprint
+                index.passages = state["passages"]
+                index.doc_lengths = array('I', state["doc_lengths"])
+                index.postings = {term: (array('I', ids), array('H', tfs))
+                                  for term, (ids, tfs) in state["postings"].items()}
+                index._weigh()
+                return index
+        index = cls.build(transcript_file, reference_files)
+        index.save(index_file)
+        return index
+
+    def save(self, index_file=INDEX_FILE):
+        # Plain JSON data, so a stale or edited cache file can only fail to
+        # match, never run code
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        state = {
+            "fingerprint": getattr(self, "fingerprint", None),
+            "passages": self.passages,
+            "doc_lengths": self.doc_lengths.tolist(),
+            "postings": {term: [ids.tolist(), tfs.tolist()] for term, (ids, tfs) in self.postings.items()}
+        }
+        tmp = index_file + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp, index_file)
+
+    def score(self, query):
+        scores = {}
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in zip(*posting):
+                norm = K1 * (1 - B + B * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query, top_k=DEFAULT_TOP_K, token_budget=DEFAULT_TOKEN_BUDGET):
+        # Best passages first, skipping any that would overflow the budget
+        scores = self.score(query)
+        results = []
+        used = 0
+        for doc_id in sorted(scores, key=scores.get, reverse=True):
+            if len(results) >= top_k:
+                break
+            passage = self.passages[doc_id]
+            cost = estimate_tokens(passage["text"])
+            if used + cost > token_budget:
+                continue
+            used += cost
+            results.append({**passage, "score": round(scores[doc_id], 4), "tokens": cost})
+        return results
+
+def format_context(results):
+    return "\n".join(r["text"] for r in results)
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 context retrieval over the transcript and reference documents")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="Rebuild and save the index")
+    query = sub.add_parser("query", help="Print the top passages for a question as JSON")
+    query.add_argument("question")
+    query.add_argument("-k", "--top-k", type=int, default=DEFAULT_TOP_K)
+    query.add_argument("--budget", type=int, default=DEFAULT_TOKEN_BUDGET, help="Token budget for the returned passages")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = ContextIndex.build()
+        index.save()
+        print(f"Indexed {len(index.passages)} passages, {len(index.postings)} terms -> {INDEX_FILE}")
+    else:
+        index = ContextIndex.load()
+        print(json.dumps(index.search(args.question, args.top_k, args.budget), ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import json
+import os
+
+OUTPUT_FILE = 'src/lib/context_windows.json'
+# Same shape the player builds today: the insertion line and the two before
+# it, then the three lines after it
+BEFORE_LINES = 3
+AFTER_LINES = 3
+CHAR_BUDGET = 600 # Per side, so prompt size stays bounded even for long turns
+
+def format_line(record):
+    return f"{record['speaker']}: {record['content']}"
+
+def _fit(lines, budget, keep_tail):
+    # Joins lines (nearest to the insertion point first) until the budget is
+    # spent; the line that overflows is clipped on its far side
+    kept = []
+    used = 0
+    for line in lines:
+        cost = len(line) + (1 if kept else 0)
+        if used + cost > budget:
+            room = budget - used - (1 if kept else 0) - 1
+            if room > 0:
+                kept.append("…" + line[-room:] if keep_tail else line[:room] + "…")
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+def build_windows(records, before_lines=BEFORE_LINES, after_lines=AFTER_LINES, char_budget=CHAR_BUDGET):
+    # For every segment i, the [before, after] text around an insertion
+    # made right after segment i
+    lines = [format_line(r) for r in records]
+    windows = []
+    for i in range(len(lines)):
+        before = lines[max(0, i - before_lines + 1):i + 1][::-1]
+        after = lines[i + 1:i + 1 + after_lines]
+        windows.append([
+            "\n".join(_fit(before, char_budget, keep_tail=True)[::-1]),
+            "\n".join(_fit(after, char_budget, keep_tail=False))
+        ])
+    return windows
+
+def write_windows(records, output_file=OUTPUT_FILE, **kwargs):
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    windows = build_windows(list(records), **kwargs)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(windows, f, ensure_ascii=False, separators=(',', ':'))
+    return len(windows)
@@ -1,40 +1,26 @@
 import csv
-import json
+from context_windows import OUTPUT_FILE as CONTEXT_WINDOWS_FILE, write_windows
+from transcript_binary import BINARY_OUTPUT_FILE, write_binary
+from transcript_ingest import to_record, write_json
 
 input_file = 'podcast_transcript.csv'
 output_file = 'src/lib/transcript.json'
+binary_output_file = BINARY_OUTPUT_FILE
+context_windows_file = CONTEXT_WINDOWS_FILE
 
-def time_to_seconds(time_str):
-    parts = list(map(int, time_str.split(':')))
-    if len(parts) == 2:
-        return parts[0] * 60 + parts[1]
-    elif len(parts) == 3:
-        return parts[0] * 3600 + parts[1] * 60 + parts[2]
-    return 0
-
-def convert_to_json():
-    transcript_data = []
-    
+def iter_csv_records():
     with open(input_file, 'r', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
-            seconds = time_to_seconds(row['Timestamp'])
-            transcript_data.append({
-                'speaker': row['Speaker'],
-                'timestamp': row['Timestamp'],
-                'seconds': seconds,
-                'content': row['Content']
-            })
-
-    # Ensure lib directory exists
-    import os
-    os.makedirs('src/lib', exist_ok=True)
+            yield to_record(row['Speaker'], row['Timestamp'], row['Content'])
 
-    with open(output_file, 'w', encoding='utf-8') as jsonfile:
-        json.dump(transcript_data, jsonfile, ensure_ascii=False, indent=2)
+def convert_to_json():
+    records = list(iter_csv_records()) # Parsed once for all three outputs
+    write_json(records, output_file)
+    write_binary(records, binary_output_file)
+    write_windows(records, context_windows_file)
 
-    print(f"Successfully converted to {output_file}")
+    print(f"Successfully converted to {output_file}, {binary_output_file} and {context_windows_file}")
 
 if __name__ == "__main__":
     convert_to_json()
-
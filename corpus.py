@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import re
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cut_audio
+import metrics
+from build_cache import BuildManifest
+from transcript_binary import write_binary
+from transcript_ingest import detect_encoding, iter_records, write_json
+
+OUTPUT_ROOT = os.path.abspath("corpus_output")
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".wav", ".flac")
+SUMMARY_FILE = "corpus_summary.json"
+
+def find_audio(directory, stem=None):
+    for name in sorted(os.listdir(directory)):
+        base, ext = os.path.splitext(name)
+        if ext.lower() in AUDIO_EXTENSIONS and (stem is None or base == stem):
+            return os.path.join(directory, name)
+    return None
+
+def discover_episodes(episodes_dir):
+    # An episode is either a subdirectory holding one transcript .txt and one
+    # audio file, or a top-level .txt with an audio file of the same stem
+    episodes = []
+    for name in sorted(os.listdir(episodes_dir)):
+        path = os.path.join(episodes_dir, name)
+        if os.path.isdir(path):
+            texts = sorted(n for n in os.listdir(path) if n.lower().endswith(".txt"))
+            audio = find_audio(path)
+            if texts and audio:
+                episodes.append((name, audio, os.path.join(path, texts[0])))
+            else:
+                print(f"Skipping {path}: needs a .txt transcript and an audio file")
+        elif name.lower().endswith(".txt"):
+            stem = os.path.splitext(name)[0]
+            audio = find_audio(episodes_dir, stem)
+            if audio:
+                episodes.append((stem, audio, path))
+            else:
+                print(f"Skipping {path}: no audio file named {stem}.*")
+    return episodes
+
+def clip_filename(speaker):
+    minutes = cut_audio.TARGET_DURATION // 60
+    slug = re.sub(r'[^\w]+', '_', speaker).strip('_') or 'speaker'
+    return f"{slug}_pure_{minutes}min.mp3"
+
+def process_episode(episode, output_root, engine, clip_workers, force):
+    # Runs parse -> convert -> reference-clip extraction for one episode.
+    # Executed in a worker process; returns a picklable result dict.
+    name, audio, transcript_txt = episode
+    output_dir = os.path.join(output_root, name)
+    os.makedirs(output_dir, exist_ok=True)
+    result = {"episode": name, "audio": audio, "output_dir": output_dir, "timings": {}}
+    timings = result["timings"]
+    start = time.perf_counter()
+
+    try:
+        t = time.perf_counter()
+        encoding = detect_encoding(transcript_txt)
+        records = list(iter_records(transcript_txt, encoding))
+        timings["parse"] = time.perf_counter() - t
+        result["segments"] = len(records)
+
+        t = time.perf_counter()
+        json_path = os.path.join(output_dir, "transcript.json")
+        write_json(records, json_path)
+        write_binary(records, os.path.join(output_dir, "transcript.bin"))
+        timings["convert"] = time.perf_counter() - t
+
+        speakers = list(dict.fromkeys(r['speaker'] for r in records))
+        jobs = [(speaker, clip_filename(speaker)) for speaker in speakers]
+        engine_kwargs = {}
+        if engine == "segments":
+            engine_kwargs["temp_dir"] = os.path.join(output_dir, "temp_audio_segments")
+
+        t = time.perf_counter()
+        report = cut_audio.build_clips(
+            jobs, engine=engine, workers=clip_workers, force=force,
+            input_audio=audio, transcript_file=json_path, output_dir=output_dir,
+            manifest=BuildManifest(os.path.join(output_dir, "build_manifest.json")),
+            **engine_kwargs
+        )
+        timings["clips"] = time.perf_counter() - t
+        result["clips"] = [
+            {"speaker": speaker, "segments": count, "duration": duration}
+            for speaker, count, duration in report["clips"]
+        ]
+        missing = [f for _, f in jobs if not os.path.exists(os.path.join(output_dir, f))]
+        if missing:
+            raise RuntimeError(f"clip extraction failed for {', '.join(missing)}")
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["traceback"] = traceback.format_exc()
+
+    timings["total"] = time.perf_counter() - start
+    result["audio_bytes"] = os.path.getsize(audio) if os.path.exists(audio) else 0
+    return result
+
+def run_corpus(episodes_dir, output_root=OUTPUT_ROOT, jobs=None, engine="cache", force=False):
+    episodes = discover_episodes(episodes_dir)
+    if not episodes:
+        print(f"No episodes found in {episodes_dir}")
+        return None
+
+    cpus = os.cpu_count() or 1
+    jobs = max(1, min(jobs or cpus, len(episodes)))
+    # Split the cores between episodes so ffmpeg pools do not oversubscribe
+    clip_workers = max(1, cpus // jobs)
+    print(f"Processing {len(episodes)} episodes with {jobs} processes ({clip_workers} clip workers each)")
+
+    os.makedirs(output_root, exist_ok=True)
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(process_episode, ep, output_root, engine, clip_workers, force) for ep in episodes]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            status = "FAILED " + result["error"] if "error" in result else "ok"
+            print(f"[{len(results)}/{len(episodes)}] {result['episode']}: {result['timings']['total']:.2f}s {status}")
+
+    wall = time.perf_counter() - start
+    results.sort(key=lambda r: r["episode"])
+    summary = {
+        "episodes": len(results),
+        "failed": sum(1 for r in results if "error" in r),
+        "processes": jobs,
+        "clip_workers": clip_workers,
+        "wall_seconds": wall,
+        "episodes_per_second": len(results) / wall if wall else 0.0,
+        "audio_mb_per_second": sum(r["audio_bytes"] for r in results) / 1e6 / wall if wall else 0.0,
+        "results": results
+    }
+    with open(os.path.join(output_root, SUMMARY_FILE), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    print_summary(summary)
+    return summary
+
+def print_summary(summary):
+    print("\n--- Corpus Summary ---")
+    print(f"{'episode':<32} {'segs':>6} {'parse':>8} {'convert':>8} {'clips':>8} {'total':>8}")
+    for r in summary["results"]:
+        t = r["timings"]
+        print(f"{r['episode'][:32]:<32} {r.get('segments', 0):>6} "
+              f"{t.get('parse', 0):>8.2f} {t.get('convert', 0):>8.2f} {t.get('clips', 0):>8.2f} {t['total']:>8.2f}")
+    print(f"\n{summary['episodes']} episodes ({summary['failed']} failed) in {summary['wall_seconds']:.2f}s "
+          f"-> {summary['episodes_per_second']:.2f} episodes/s, {summary['audio_mb_per_second']:.1f} MB audio/s")
+    for r in summary["results"]:
+        if "error" in r:
+            print(f"\n{r['episode']} failed:\n{r['traceback']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run parse -> convert -> clip extraction for a directory of episodes")
+    parser.add_argument("episodes_dir")
+    parser.add_argument("-o", "--output", default=OUTPUT_ROOT, help="Root for per-episode output directories")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Episodes processed in parallel (default: CPU count)")
+    parser.add_argument("--engine", choices=sorted(cut_audio.ENGINES), default="cache")
+    parser.add_argument("--force", action="store_true", help="Rebuild clips even if they are up to date")
+    args = parser.parse_args()
+
+    run_corpus(args.episodes_dir, os.path.abspath(args.output), args.jobs, args.engine, args.force)
+
+if __name__ == "__main__":
+    with metrics.run("corpus"):
+        main()
@@ -1,122 +1,439 @@
-import json
+import argparse
 import subprocess
 import os
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from build_cache import BuildManifest
+from transcript_index import TranscriptIndex
 
 # Configuration
 INPUT_AUDIO = os.path.abspath("static/podcast.mp3")
-TRANSCRIPT_FILE = "src/lib/transcript.json"
+TRANSCRIPT_FILE = "src/lib/transcript.bin"
 OUTPUT_DIR = os.path.abspath("static")
 TEMP_DIR = os.path.abspath("temp_audio_segments")
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Raw PCM format used between the segment decoders and the clip encoder
+STREAM_SAMPLE_RATE = 44100
+STREAM_CHANNELS = 1
+PIPE_CHUNK = 1 << 16
 TARGET_DURATION = 120 # Target pure audio duration in seconds
 
-def get_all_segments():
-    with open(TRANSCRIPT_FILE, 'r', encoding='utf-8') as f:
-        transcript = json.load(f)
-    
-    segments = []
-    for i in range(len(transcript)):
-        current = transcript[i]
-        start_time = current['seconds']
-        
-        # Calculate duration based on next segment
-        if i < len(transcript) - 1:
-            end_time = transcript[i+1]['seconds']
-        else:
-            end_time = start_time + 5 # Estimate for last segment
-            
-        duration = end_time - start_time
-        
-        if duration <= 0:
+# (speaker, output filename) pairs extracted in the same decode pass
+CLIP_JOBS = [
+    ("罗永浩", "luo_pure_2min.mp3"),
+    ("Tim", "tim_pure_2min.mp3"),
+]
+
+def get_all_segments(index=None):
+    if index is None:
+        index = TranscriptIndex.load(TRANSCRIPT_FILE)
+    return index.segments()
+
+def select_segments(index, target_speaker):
+    # Leading segments of the speaker until TARGET_DURATION is reached
+    positions, current_duration = index.first_seconds(target_speaker, TARGET_DURATION)
+    return index.segments(positions), current_duration
+
+def build_filter_graph(clips):
+    # One decode of [0:a] is split into a branch per segment; each branch is
+    # trimmed to its window and the branches of a clip are concatenated.
+    total = sum(len(segments) for segments in clips)
+    branches = "".join(f"[s{i}]" for i in range(total))
+    parts = [f"[0:a]asplit={total}{branches}"] if total > 1 else ["[0:a]anull[s0]"]
+
+    n = 0
+    for c, segments in enumerate(clips):
+        labels = ""
+        for seg in segments:
+            end = seg['start'] + seg['duration']
+            parts.append(f"[s{n}]atrim=start={seg['start']}:end={end},asetpts=PTS-STARTPTS[a{n}]")
+            labels += f"[a{n}]"
+            n += 1
+        parts.append(f"{labels}concat=n={len(segments)}:v=0:a=1[out{c}]")
+
+    return ";".join(parts)
+
+def collect_clips(index, jobs, output_dir=OUTPUT_DIR):
+    clips = []
+    outputs = []
+    report = []
+
+    for target_speaker, output_filename in jobs:
+        selected_segments, current_duration = select_segments(index, target_speaker)
+        if not selected_segments:
+            print(f"No segments found for {target_speaker}")
             continue
 
-        segments.append({
-            "speaker": current['speaker'],
-            "start": start_time,
-            "duration": duration,
-            "content": current['content']
-        })
-        
-    return segments
-
-def extract_and_merge(all_segments, target_speaker, output_filename):
-    # Filter for target speaker
-    speaker_segments = [s for s in all_segments if target_speaker in s['speaker']]
-    
-    if not speaker_segments:
-        print(f"No segments found for {target_speaker}")
-        return
-
-    # Select segments until we reach TARGET_DURATION
-    selected_segments = []
-    current_duration = 0
-    
-    for seg in speaker_segments:
-        if current_duration >= TARGET_DURATION:
-            break
-        selected_segments.append(seg)
-        current_duration += seg['duration']
-    
-    print(f"Collecting segments for {target_speaker}: Found {len(selected_segments)} segments, Total duration: {current_duration:.2f}s")
-    
-    segment_files = []
-    
-    # Extract each segment
-    for i, seg in enumerate(selected_segments):
-        seg_filename = os.path.join(TEMP_DIR, f"{target_speaker}_{i}.mp3")
-        
-        # ffmpeg command to extract segment
-        cmd = [
-            "ffmpeg", "-y", "-i", INPUT_AUDIO,
-            "-ss", str(seg['start']),
-            "-t", str(seg['duration']),
-            "-q:a", "2", # High quality VBR
-            seg_filename
-        ]
-        
-        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        segment_files.append(seg_filename)
-    
-    # Create file list for concatenation
-    list_filename = os.path.join(TEMP_DIR, f"{target_speaker}_list.txt")
+        print(f"Collecting segments for {target_speaker}: Found {len(selected_segments)} segments, Total duration: {current_duration:.2f}s")
+        clips.append(selected_segments)
+        outputs.append(os.path.join(output_dir, output_filename))
+        report.append((target_speaker, len(selected_segments), current_duration))
+
+    return clips, outputs, report
+
+def temp_path(output_path):
+    # Keeps the extension so ffmpeg still picks the output format from it
+    root, ext = os.path.splitext(output_path)
+    return f"{root}.part{ext}"
+
+def write_atomically(output_path, write):
+    # Runs write(tmp_path) and moves the result into place only if it
+    # succeeds, so a failed encode never leaves a partial clip behind
+    tmp = temp_path(output_path)
+    try:
+        write(tmp)
+        os.replace(tmp, output_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return output_path
+
+def extract_clips(index, jobs, workers=1, input_audio=INPUT_AUDIO, output_dir=OUTPUT_DIR):
+    # Decode-once path: slice every segment out of the cached PCM map and
+    # stream the views straight into one encoder per clip.
+    import pcm_cache
+
+    clips, outputs, report = collect_clips(index, jobs, output_dir)
+    if not clips:
+        return [], []
+
+    pcm = pcm_cache.load(input_audio)
+
+    def encode(segments, output_path):
+        views = [pcm_cache.slice_seconds(pcm, seg['start'], seg['duration']) for seg in segments]
+        return write_atomically(output_path, lambda tmp: pcm_cache.write_clip(views, tmp))
+
+    built = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(clips)))) as pool:
+        futures = [pool.submit(encode, segments, output_path) for segments, output_path in zip(clips, outputs)]
+        for future, output_path in zip(futures, outputs):
+            try:
+                future.result()
+                built.append(output_path)
+                print(f"Created {output_path}")
+            except (RuntimeError, OSError) as e:
+                print(f"Failed to create {output_path}: {e}")
+
+    return report, built
+
+def extract_segment(seg, seg_filename, input_audio=INPUT_AUDIO):
+    # -ss before -i seeks in the demuxer instead of decoding from the start
+    cmd = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-ss", str(seg['start']),
+        "-t", str(seg['duration']),
+        "-i", input_audio,
+        "-q:a", "2", # High quality VBR
+        seg_filename
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip()[-500:] or f"exit code {result.returncode}")
+    return seg_filename
+
+def concat_files(segment_files, list_filename, output_path):
     with open(list_filename, 'w') as f:
         for sf in segment_files:
             f.write(f"file '{sf}'\n")
-            
-    # Concatenate
-    output_path = os.path.join(OUTPUT_DIR, output_filename)
+
     concat_cmd = [
-        "ffmpeg", "-y", "-f", "concat", "-safe", "0",
+        "ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
         "-i", list_filename,
         "-c", "copy",
         output_path
     ]
-    
-    # Run concatenation
-    subprocess.run(concat_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    
-    if os.path.exists(output_path):
-        print(f"Created {output_path}")
-    else:
-        print(f"Failed to create {output_path}")
+    result = subprocess.run(concat_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip()[-500:])
 
-def main():
-    if os.path.exists(TEMP_DIR):
-        shutil.rmtree(TEMP_DIR)
-    os.makedirs(TEMP_DIR)
-    
+def extract_clips_parallel(index, jobs, workers=DEFAULT_WORKERS, input_audio=INPUT_AUDIO,
+                           output_dir=OUTPUT_DIR, temp_dir=TEMP_DIR):
+    # Re-encodes every segment as its own ffmpeg process on a bounded pool,
+    # then concatenates each clip's segments in transcript order.
+    clips, outputs, report = collect_clips(index, jobs, output_dir)
+    if not clips:
+        return [], []
+
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
+    os.makedirs(temp_dir)
+
+    built = []
     try:
-        # Get ALL segments first
-        all_segments = get_all_segments()
-        
-        # Extract until 2 mins of pure audio is reached for each
-        extract_and_merge(all_segments, "罗永浩", "luo_pure_2min.mp3")
-        extract_and_merge(all_segments, "Tim", "tim_pure_2min.mp3")
-        
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            # Submit everything up front so all clips share the pool
+            clip_futures = []
+            for c, segments in enumerate(clips):
+                futures = []
+                for i, seg in enumerate(segments):
+                    seg_filename = os.path.join(temp_dir, f"clip{c}_{i:05d}.mp3")
+                    futures.append((seg, pool.submit(extract_segment, seg, seg_filename, input_audio)))
+                clip_futures.append(futures)
+
+            for c, (futures, output_path) in enumerate(zip(clip_futures, outputs)):
+                segment_files = []
+                errors = []
+                for i, (seg, future) in enumerate(futures):
+                    try:
+                        segment_files.append(future.result())
+                    except RuntimeError as e:
+                        errors.append(f"  segment {i} @ {seg['start']}s (+{seg['duration']}s): {e}")
+
+                if errors:
+                    print(f"Failed to create {output_path}: {len(errors)} segment(s) failed")
+                    for line in errors:
+                        print(line)
+                    continue
+
+                list_filename = os.path.join(temp_dir, f"clip{c}_list.txt")
+                try:
+                    write_atomically(output_path, lambda tmp: concat_files(segment_files, list_filename, tmp))
+                    built.append(output_path)
+                    print(f"Created {output_path}")
+                except (RuntimeError, OSError) as e:
+                    print(f"Failed to create {output_path}: {e}")
     finally:
         # Cleanup
-        if os.path.exists(TEMP_DIR):
-           shutil.rmtree(TEMP_DIR)
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+
+    return report, built
+
+def _drain(pipe, sink):
+    for chunk in iter(lambda: pipe.read(PIPE_CHUNK), b""):
+        sink(chunk)
+
+def render_clip(segments, output=None, input_audio=INPUT_AUDIO):
+    # Decodes each segment to PCM on a pipe and feeds it straight into one
+    # encoder, so nothing touches the disk. The encoded clip is written to
+    # `output` (a binary file object) if given, otherwise returned as bytes.
+    pcm_args = ["-f", "s16le", "-ac", str(STREAM_CHANNELS), "-ar", str(STREAM_SAMPLE_RATE)]
+    encoder = subprocess.Popen(
+        ["ffmpeg", "-y", "-loglevel", "error", *pcm_args, "-i", "pipe:0",
+         "-q:a", "2", "-f", "mp3", "pipe:1"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+
+    chunks = []
+    errors = []
+    readers = [
+        threading.Thread(target=_drain, args=(encoder.stdout, output.write if output else chunks.append)),
+        threading.Thread(target=_drain, args=(encoder.stderr, errors.append)),
+    ]
+    for t in readers:
+        t.start()
+
+    try:
+        for i, seg in enumerate(segments):
+            # Leaving the block closes the decoder's pipes and waits for it
+            with subprocess.Popen(
+                ["ffmpeg", "-loglevel", "error",
+                 "-ss", str(seg['start']), "-t", str(seg['duration']),
+                 "-i", input_audio, *pcm_args, "pipe:1"],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            ) as decoder:
+                try:
+                    shutil.copyfileobj(decoder.stdout, encoder.stdin, PIPE_CHUNK)
+                except BaseException:
+                    decoder.kill()
+                    raise
+                decoder.stdout.close()
+                stderr = decoder.stderr.read()
+            if decoder.returncode != 0:
+                raise RuntimeError(f"segment {i} @ {seg['start']}s: {stderr.decode('utf-8', 'replace').strip()[-500:]}")
+    except BrokenPipeError:
+        pass # The encoder stopped reading; its stderr says why
+    except BaseException:
+        encoder.kill()
+        raise
+    finally:
+        try:
+            encoder.stdin.close()
+        except BrokenPipeError:
+            pass
+        for t in readers:
+            t.join()
+        encoder.wait()
+
+    if encoder.returncode != 0:
+        raise RuntimeError(b"".join(errors).decode('utf-8', 'replace').strip()[-500:])
+
+    return None if output else b"".join(chunks)
+
+def extract_clips_streaming(index, jobs, workers=1, input_audio=INPUT_AUDIO, output_dir=OUTPUT_DIR):
+    clips, outputs, report = collect_clips(index, jobs, output_dir)
+    if not clips:
+        return [], []
+
+    def write(segments, output_path):
+        def render(tmp):
+            with open(tmp, 'wb') as f:
+                render_clip(segments, output=f, input_audio=input_audio)
+        return write_atomically(output_path, render)
+
+    built = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(clips)))) as pool:
+        futures = [pool.submit(write, segments, output_path) for segments, output_path in zip(clips, outputs)]
+        for future, output_path in zip(futures, outputs):
+            try:
+                future.result()
+                built.append(output_path)
+                print(f"Created {output_path}")
+            except (RuntimeError, OSError) as e:
+                print(f"Failed to create {output_path}: {e}")
+
+    return report, built
+
+def render_speaker_clip(target_speaker, index=None):
+    # In-memory entry point: returns the speaker's reference clip as MP3 bytes
+    if index is None:
+        index = TranscriptIndex.load(TRANSCRIPT_FILE)
+    selected_segments, _ = select_segments(index, target_speaker)
+    if not selected_segments:
+        return None
+    return render_clip(selected_segments)
+
+def extract_clips_graph(index, jobs, workers=1, input_audio=INPUT_AUDIO, output_dir=OUTPUT_DIR):
+    clips, outputs, report = collect_clips(index, jobs, output_dir)
+    if not clips:
+        return [], []
+
+    tmps = [temp_path(output_path) for output_path in outputs]
+    cmd = ["ffmpeg", "-y", "-i", input_audio, "-filter_complex", build_filter_graph(clips)]
+    for c, tmp in enumerate(tmps):
+        cmd += ["-map", f"[out{c}]", "-q:a", "2", tmp] # High quality VBR
+
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        print(f"ffmpeg failed: {result.stderr.decode('utf-8', 'replace')[-500:]}")
+
+    # One process writes every clip, so a failure leaves them all suspect
+    built = []
+    for tmp, output_path in zip(tmps, outputs):
+        if result.returncode == 0 and os.path.exists(tmp):
+            os.replace(tmp, output_path)
+            built.append(output_path)
+            print(f"Created {output_path}")
+        else:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            print(f"Failed to create {output_path}")
+
+    return report, built
+
+def extract_clips_frames(index, jobs, workers=1, input_audio=INPUT_AUDIO, output_dir=OUTPUT_DIR):
+    # No re-encode: each segment's MP3 frames are copied out of the source
+    # through the frame index. Frames decode exactly as in the source; the
+    # joins between segments are frame-level splices.
+    from frame_index import FrameIndex
+
+    clips, outputs, report = collect_clips(index, jobs, output_dir)
+    if not clips:
+        return [], []
+
+    frames = FrameIndex.load(input_audio)
+    built = []
+    for segments, output_path in zip(clips, outputs):
+        try:
+            frames.cut(segments, output_path) # Written to a temp file and renamed
+            built.append(output_path)
+            print(f"Created {output_path}")
+        except (ValueError, OSError) as e:
+            print(f"Failed to create {output_path}: {e}")
+
+    return report, built
+
+def clip_params(target_speaker, engine="cache"):
+    # Everything besides the input files that changes a clip's bytes. The
+    # engines differ in sample format and encoder input, so each one's
+    # clips are only fresh for that engine.
+    return {
+        "speaker": target_speaker,
+        "target_duration": TARGET_DURATION,
+        "engine": engine,
+        "quality": "copy" if engine == "frames" else "-q:a 2"
+    }
+
+def stale_jobs(manifest, jobs, inputs, output_dir=OUTPUT_DIR, engine="cache"):
+    return [
+        (speaker, filename) for speaker, filename in jobs
+        if not manifest.is_fresh(os.path.join(output_dir, filename), inputs, clip_params(speaker, engine))
+    ]
+
+def record_jobs(manifest, jobs, inputs, built, output_dir=OUTPUT_DIR, engine="cache"):
+    # Only clips the engine reports as written are recorded
+    built = {os.path.abspath(p) for p in built}
+    for speaker, filename in jobs:
+        output_path = os.path.join(output_dir, filename)
+        if os.path.abspath(output_path) in built:
+            manifest.record(output_path, inputs, clip_params(speaker, engine))
+    manifest.save()
+
+ENGINES = {
+    "cache": extract_clips,
+    "frames": extract_clips_frames,
+    "graph": extract_clips_graph,
+    "segments": extract_clips_parallel,
+    "stream": extract_clips_streaming,
+}
+
+def build_clips(jobs=CLIP_JOBS, engine="cache", workers=DEFAULT_WORKERS, force=False,
+                input_audio=INPUT_AUDIO, transcript_file=TRANSCRIPT_FILE, output_dir=OUTPUT_DIR,
+                manifest=None, **engine_kwargs):
+    # Rebuilds the stale clips among `jobs` and returns the timing report
+    t0 = time.perf_counter()
+    if manifest is None:
+        manifest = BuildManifest()
+    inputs = [input_audio, transcript_file]
+    stale = list(jobs) if force else stale_jobs(manifest, jobs, inputs, output_dir, engine)
+    for speaker, filename in jobs:
+        if (speaker, filename) not in stale:
+            print(f"Up to date: {os.path.join(output_dir, filename)}")
+    if not stale:
+        print(f"Nothing to rebuild ({time.perf_counter() - t0:.3f}s)")
+        return {"clips": [], "built": [], "load": time.perf_counter() - t0, "extract": 0.0}
+
+    with metrics.span("transcript_load"):
+        index = TranscriptIndex.load(transcript_file)
+    t1 = time.perf_counter()
+
+    # Extract until 2 mins of pure audio is reached for each, from one decode
+    with metrics.span("ffmpeg", engine=engine, clips=len(stale)) as span:
+        report, built = ENGINES[engine](index, stale, workers=workers, input_audio=input_audio,
+                                        output_dir=output_dir, **engine_kwargs)
+        for output_path in built:
+            span.add_bytes(os.path.getsize(output_path))
+    record_jobs(manifest, stale, inputs, built, output_dir, engine)
+    t2 = time.perf_counter()
+
+    print("\n--- Timing ---")
+    print(f"Manifest check + transcript load: {t1 - t0:.3f}s ({len(index)} segments, {len(index.speakers)} speakers)")
+    for speaker, count, duration in report:
+        print(f"{speaker}: {count} segments, {duration:.2f}s of audio")
+    print(f"Extraction ({engine}, {workers} workers): {t2 - t1:.3f}s")
+    print(f"Total: {t2 - t0:.3f}s")
+
+    return {"clips": report, "built": built, "load": t1 - t0, "extract": t2 - t1}
+
+def main():
+    parser = argparse.ArgumentParser(description="Cut per-speaker reference clips from the podcast")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="cache",
+                        help="cache: slice the decoded PCM cache; frames: copy MP3 frames without re-encoding; graph: one ffmpeg trim/concat graph; "
+                             "segments: re-encode each segment on a worker pool; "
+                             "stream: pipe segments into the encoder without temp files")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Maximum concurrent ffmpeg processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true",
+                        help="Rebuild every clip even if the build manifest says it is up to date")
+    args = parser.parse_args()
+
+    with metrics.run("cut_audio"):
+        build_clips(engine=args.engine, workers=args.workers, force=args.force)
 
 if __name__ == "__main__":
     main()
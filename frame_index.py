@@ -0,0 +1,320 @@
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+import mp3_frames
+
+# Byte offset of every MP3 frame in an episode, so a time range maps to a
+# byte range with arithmetic and can be copied out without decoding or
+# re-encoding. File layout (little-endian):
+#   header   magic, version, samples per frame, sample rate, frame count,
+#            encoder delay, padding, source size and mtime, first audio
+#            frame header, source LAME tag (zeros if none)
+#   offsets  uint64[n+1]  frame start positions, then the end of the last frame
+# Frame i starts at sample i * samples_per_frame - delay of the decoded
+# audio, so timestamps need no column of their own.
+INPUT_AUDIO = os.path.abspath("static/podcast.mp3")
+INDEX_DIR = os.path.abspath(".cache/frames")
+MAGIC = b"MP3X"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIIHHQQ3sx36s")
+LEAD_IN_FRAMES = 1 # Decoded ahead of a cut for the overlap with the previous frame, then trimmed as encoder delay
+
+def index_path(path, index_dir=INDEX_DIR):
+    key = hashlib.sha256(os.path.abspath(path).encode('utf-8')).hexdigest()[:24]
+    return os.path.join(index_dir, f"{key}.idx")
+
+def _le(arr):
+    if sys.byteorder != 'little':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+class FrameIndex:
+    def __init__(self, source, offsets, sample_rate, samples_per_frame, delay=0, padding=0,
+                 first_header=b"", lame=None):
+        self.source = source
+        self.offsets = offsets
+        self.sample_rate = sample_rate
+        self.samples_per_frame = samples_per_frame
+        self.delay = delay
+        self.padding = padding
+        self.first_header = first_header
+        self.lame = lame
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def build(cls, path):
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            start, end = mp3_frames.audio_bounds(data)
+            frames = mp3_frames.iter_frames(data, start, end)
+            first = next(frames, None)
+            if first is None:
+                raise ValueError(f"No MPEG audio frames in {path}")
+            vbr = mp3_frames.read_vbr_header(data, *first)
+            if vbr is None:
+                frames = mp3_frames.iter_frames(data, first[0], end)
+
+            offsets = array('Q')
+            header = None
+            pos = h = None
+            for pos, h in frames:
+                if header is None:
+                    header = h
+                    first_header = bytes(data[pos + 1:pos + 4])
+                offsets.append(pos)
+            if header is None:
+                raise ValueError(f"No MPEG audio frames in {path}")
+            offsets.append(pos + h.size)
+        finally:
+            data.close()
+
+        return cls(
+            path, offsets, header.sample_rate, header.samples,
+            delay=vbr["delay"] if vbr else 0,
+            padding=vbr["padding"] if vbr else 0,
+            first_header=first_header,
+            lame=vbr.get("lame") if vbr else None
+        )
+
+    @classmethod
+    def load(cls, path=INPUT_AUDIO, index_dir=INDEX_DIR):
+        # Loads the saved index, rebuilding it if the source changed since
+        index_file = index_path(path, index_dir)
+        st = os.stat(path)
+        if os.path.exists(index_file):
+            with open(index_file, 'rb') as f:
+                blob = f.read()
+            (magic, version, spf, rate, count, delay, padding,
+             size, mtime_ns, first_header, lame) = HEADER.unpack_from(blob)
+            if (magic, version, size, mtime_ns) == (MAGIC, VERSION, st.st_size, st.st_mtime_ns):
+                offsets = array('Q')
+                offsets.frombytes(blob[HEADER.size:HEADER.size + 8 * (count + 1)])
+                if sys.byteorder != 'little':
+                    offsets.byteswap()
+                return cls(path, offsets, rate, spf, delay, padding, first_header,
+                           lame if any(lame) else None)
+
+        index = cls.build(path)
+        index.save(index_file)
+        return index
+
+    def save(self, index_file=None):
+        index_file = index_file or index_path(self.source)
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        st = os.stat(self.source)
+        tmp = index_file + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.samples_per_frame, self.sample_rate, len(self),
+                                self.delay, self.padding, st.st_size, st.st_mtime_ns,
+                                self.first_header, self.lame or bytes(mp3_frames.LAME_TAG_SIZE)))
+            f.write(_le(self.offsets))
+        os.replace(tmp, index_file)
+        return index_file
+
+    @property
+    def duration(self):
+        return (len(self) * self.samples_per_frame - self.delay - self.padding) / self.sample_rate
+
+    def time_of(self, frame):
+        # Start of frame `frame` in seconds of decoded audio
+        return (frame * self.samples_per_frame - self.delay) / self.sample_rate
+
+    def _raw_sample(self, seconds):
+        # Position in the encoded stream, clamped to the audible range
+        last = len(self) * self.samples_per_frame - self.padding
+        return min(max(self.delay, round(seconds * self.sample_rate) + self.delay), last)
+
+    def frame_at(self, seconds):
+        return min(len(self) - 1, self._raw_sample(seconds) // self.samples_per_frame)
+
+    def seek_offset(self, seconds):
+        # Byte offset of the frame holding `seconds`, for fast seeking
+        return self.offsets[self.frame_at(seconds)]
+
+    def frame_range(self, start, duration):
+        # Frames [first, stop) covering the range, plus the samples to trim
+        # from the front and back for a sample-accurate cut
+        spf = self.samples_per_frame
+        r0 = self._raw_sample(start)
+        r1 = self._raw_sample(start + duration)
+        first = r0 // spf
+        stop = min(len(self), -(-r1 // spf))
+        return first, stop, r0 - first * spf, stop * spf - r1
+
+    def _data_area(self, data, i):
+        offset = self.offsets[i]
+        return mp3_frames.main_data_start(data, offset, mp3_frames.parse_header(data, offset)), self.offsets[i + 1]
+
+    def _main_data_begin(self, data, i):
+        return mp3_frames.main_data_begin(data, self.offsets[i], mp3_frames.parse_header(data, self.offsets[i]))
+
+    def _reach(self, data, start, first, lead_in):
+        # Main data bytes that frames first - lead_in..first, the ones whose
+        # output is used, take from before frame `start`
+        reach = have = 0
+        for j in range(start, first + 1):
+            if j >= first - lead_in:
+                reach = max(reach, self._main_data_begin(data, j) - have)
+            area_start, area_end = self._data_area(data, j)
+            have += area_end - area_start
+        return reach
+
+    def _lead_in(self, data, first, lead_in):
+        # Frames to decode ahead of `first`: `lead_in` for the overlap-add
+        # with the previous frame, and more while the bit reservoir of those
+        # frames or of `first` still reaches back past the lead-in
+        n = lead_in
+        while n < first and self._reach(data, first - n, first, lead_in):
+            n += 1
+        return n
+
+    def _reservoir(self, data, frame, size):
+        # The last `size` main data bytes before `frame` in the source
+        parts = []
+        have = 0
+        i = frame
+        while have < size and i > 0:
+            i -= 1
+            start, end = self._data_area(data, i)
+            parts.append(data[start:end])
+            have += end - start
+        return b"".join(reversed(parts))[-size:].rjust(size, b"\0")
+
+    def _carry_reservoir(self, data, frames, run_start, prev_stop, first):
+        # Frame `first` starts a new run right after frame prev_stop - 1 and
+        # takes the start of its main data from the frames before it. Those
+        # bytes are written into the unused tail of the previous run's main
+        # data, growing its last frame to a higher bitrate if the tail is too
+        # short, so the decoder reads the same data as in the source.
+        need = self._main_data_begin(data, first)
+        if need == 0:
+            return
+        # Main data of frames before prev_stop ends main_data_begin(prev_stop)
+        # bytes before that frame, so everything after it is free
+        free = self._main_data_begin(data, prev_stop) if prev_stop < len(self) else 0
+        if need > free:
+            frames[-1] = mp3_frames.grow_frame(frames[-1], need - free)
+        reservoir = self._reservoir(data, first, need)
+        remaining = need
+        pos = len(frames) - 1
+        while remaining:
+            if pos < run_start:
+                raise ValueError(f"Run ending at frame {prev_stop} is too short to carry the bit reservoir of frame {first}")
+            frame = bytearray(frames[pos])
+            area = mp3_frames.main_data_start(frame, 0, mp3_frames.parse_header(frame, 0))
+            n = min(remaining, len(frame) - area)
+            frame[len(frame) - n:] = reservoir[remaining - n:remaining]
+            frames[pos] = bytes(frame)
+            remaining -= n
+            pos -= 1
+
+    def plan(self, segments, lead_in=LEAD_IN_FRAMES, data=None):
+        # Frame runs for a list of {"start", "duration"} segments, the
+        # encoder delay and padding to record, and the size of the bit
+        # reservoir to prime ahead of the first run. The first cut starts
+        # `lead_in` frames early (more if `data`, the source bytes, shows
+        # the bit reservoir reaching further back) and trims them through
+        # the encoder delay. When those extra frames would not fit the
+        # 12-bit delay field, the reservoir goes into a silent frame in
+        # front instead; if even that does not fit, the start falls on the
+        # frame boundary. Later joins fall on frame boundaries, and
+        # overlapping or touching runs are merged.
+        spf = self.samples_per_frame
+        runs = []
+        delay = padding = prime = 0
+        for i, seg in enumerate(segments):
+            first, stop, trim_front, trim_back = self.frame_range(seg['start'], seg['duration'])
+            if i == 0:
+                back = min(lead_in, first)
+                if data is not None:
+                    needed = min(self._lead_in(data, first, lead_in), first)
+                    if trim_front + needed * spf <= mp3_frames.MAX_TRIM:
+                        back = needed
+                    else:
+                        prime = self._reach(data, first - back, first, lead_in)
+                first -= back
+                delay = trim_front + (back + (1 if prime else 0)) * spf
+                if delay > mp3_frames.MAX_TRIM:
+                    delay -= trim_front
+            padding = trim_back
+            if runs and first <= runs[-1][1]:
+                runs[-1] = (runs[-1][0], max(runs[-1][1], stop))
+            elif first < stop:
+                runs.append((first, stop))
+        return runs, delay, padding, prime
+
+    def cut(self, segments, output=None):
+        # Copies the segments' frames out of the source behind a fresh
+        # Info frame. Each later run gets the bit reservoir bytes its first
+        # frame borrows, so every frame decodes from the same data as in
+        # the source; at a join the decoder's overlap-add blends the two
+        # sides over one granule, as with any frame-level splice. The ends
+        # are sample-accurate when the source carries a LAME tag (so the
+        # trim can be recorded), frame-accurate otherwise. Returns the clip
+        # bytes, or writes them to `output` and returns its duration in
+        # seconds. Raises ValueError if a join cannot be made exact.
+        with open(self.source, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            runs, delay, padding, prime = self.plan(segments, data=data)
+            if not runs:
+                raise ValueError("Segments select no audio")
+            frames = []
+            if prime:
+                frames.append(mp3_frames.silent_frame(self.first_header, self._reservoir(data, runs[0][0], prime)))
+            prev_stop = run_start = None
+            for first, stop in runs:
+                if prev_stop is not None:
+                    self._carry_reservoir(data, frames, run_start, prev_stop, first)
+                run_start = len(frames)
+                frames.extend(data[self.offsets[i]:self.offsets[i + 1]] for i in range(first, stop))
+                prev_stop = stop
+        finally:
+            data.close()
+
+        sizes = [len(frame) for frame in frames]
+        bitrates = [mp3_frames.parse_header(frame, 0).bitrate for frame in frames]
+        if self.lame is None:
+            delay = padding = 0
+        info_frame = mp3_frames.build_info_frame(self.first_header, sizes, bitrates,
+                                                 delay=delay, padding=padding, lame=self.lame)
+        if output is None:
+            return info_frame + b"".join(frames)
+        tmp = output + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(info_frame)
+            f.writelines(frames)
+        os.replace(tmp, output)
+        return (len(sizes) * self.samples_per_frame - delay - padding) / self.sample_rate
+
+def main():
+    parser = argparse.ArgumentParser(description="MP3 frame index for lossless byte-range cuts")
+    parser.add_argument("--input", default=INPUT_AUDIO)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("build", help="Build (or refresh) the saved index")
+    cut = sub.add_parser("cut", help="Copy a time range into a new MP3 without re-encoding")
+    cut.add_argument("start", type=float)
+    cut.add_argument("duration", type=float)
+    cut.add_argument("output")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    index = FrameIndex.load(args.input)
+    t1 = time.perf_counter()
+    print(f"{args.input}: {len(index)} frames, {index.duration:.2f}s (index ready in {t1 - t0:.3f}s)")
+    if args.command == "cut":
+        seconds = index.cut([{"start": args.start, "duration": args.duration}], args.output)
+        print(f"Wrote {args.output}: {seconds:.3f}s in {time.perf_counter() - t1:.3f}s")
+
+if __name__ == "__main__":
+    main()
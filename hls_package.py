@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from build_cache import BuildManifest, params_hash
+from transcript_index import TranscriptIndex
+
+# Packages an episode as HLS: one AAC rendition per rung of the ladder,
+# all cut at the same times, which fall on transcript segment starts so
+# seeking to a line fetches from the start of a chunk.
+INPUT_AUDIO = os.path.abspath("static/podcast.mp3")
+TRANSCRIPT_FILE = "src/lib/transcript.bin"
+OUTPUT_DIR = os.path.abspath("static/hls")
+MASTER_PLAYLIST = "master.m3u8"
+SEGMENT_MAP = "segments.json"
+TARGET_SEGMENT = 6 # Seconds; a chunk is closed at the first line start past this
+MIN_SEGMENT = 2
+MAX_SEGMENT = 10   # Longer stretches without a line start are cut every TARGET_SEGMENT
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+LADDER = [
+    {"name": "low", "bitrate": 32000, "channels": 1, "sample_rate": 22050},
+    {"name": "mid", "bitrate": 64000, "channels": 1, "sample_rate": 44100},
+    {"name": "high", "bitrate": 128000, "channels": 2, "sample_rate": 44100},
+]
+CODECS = "mp4a.40.2" # AAC-LC
+
+def plan_boundaries(starts, total=None, target=TARGET_SEGMENT, min_len=MIN_SEGMENT, max_len=MAX_SEGMENT):
+    # Cut times (excluding 0) on line starts, keeping chunks within
+    # [min_len, max_len] wherever the transcript allows it
+    cuts = []
+    last = 0.0
+    pending = None # Latest line start not yet used as a cut
+
+    def force_until(t):
+        nonlocal last
+        while t - last > max_len:
+            last += target
+            cuts.append(last)
+
+    for s in sorted(starts):
+        if s <= last:
+            continue
+        if s - last > max_len and pending is not None and pending - last >= min_len:
+            cuts.append(pending)
+            last = pending
+        pending = None
+        force_until(s)
+        if s - last >= target:
+            cuts.append(s)
+            last = s
+        elif s - last >= min_len:
+            pending = s
+    if total is not None:
+        if total - last > max_len and pending is not None:
+            cuts.append(pending)
+            last = pending
+        force_until(total)
+        if cuts and total - cuts[-1] < min_len / 2:
+            cuts.pop() # Avoid a sliver at the very end
+    return cuts
+
+def episode_duration(input_audio):
+    if not input_audio.lower().endswith(".mp3"):
+        return None
+    from frame_index import FrameIndex
+    try:
+        return FrameIndex.load(input_audio).duration
+    except ValueError:
+        return None
+
+def rendition_cmd(input_audio, rung, cuts, out_dir):
+    return [
+        "ffmpeg", "-y", "-loglevel", "error", "-i", input_audio, "-vn",
+        "-c:a", "aac", "-b:a", str(rung["bitrate"]),
+        "-ac", str(rung["channels"]), "-ar", str(rung["sample_rate"]),
+        "-f", "segment", "-segment_format", "mpegts",
+        "-segment_times", ",".join(f"{t:.3f}" for t in cuts),
+        "-segment_list", os.path.join(out_dir, "index.m3u8"), "-segment_list_type", "m3u8",
+        os.path.join(out_dir, "seg_%05d.ts")
+    ]
+
+def read_playlist(path):
+    # (duration, filename) per segment of a media playlist
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    for i, line in enumerate(lines):
+        m = re.match(r"#EXTINF:([\d.]+)", line)
+        if m and i + 1 < len(lines):
+            entries.append((float(m.group(1)), lines[i + 1]))
+    return entries
+
+def finalize_playlist(path):
+    # Marks ffmpeg's segment list as a complete VOD playlist
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if "#EXT-X-PLAYLIST-TYPE" not in text:
+        text = text.replace("#EXTM3U\n", "#EXTM3U\n#EXT-X-PLAYLIST-TYPE:VOD\n", 1)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def render_rung(input_audio, rung, cuts, output_dir):
+    out_dir = os.path.join(output_dir, rung["name"])
+    os.makedirs(out_dir, exist_ok=True)
+    for name in os.listdir(out_dir):
+        if name.endswith((".ts", ".m3u8")):
+            os.remove(os.path.join(out_dir, name))
+    with metrics.span("hls_encode", rung=rung["name"]) as span:
+        result = subprocess.run(rendition_cmd(input_audio, rung, cuts, out_dir),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip()[-500:])
+        playlist = os.path.join(out_dir, "index.m3u8")
+        finalize_playlist(playlist)
+        span.add_bytes(sum(os.path.getsize(os.path.join(out_dir, f)) for _, f in read_playlist(playlist)))
+    return playlist
+
+def rung_bandwidth(playlist):
+    # Peak and average bits per second over the rendition's segments
+    out_dir = os.path.dirname(playlist)
+    entries = read_playlist(playlist)
+    rates = []
+    total_bits = total_seconds = 0
+    for seconds, name in entries:
+        bits = os.path.getsize(os.path.join(out_dir, name)) * 8
+        total_bits += bits
+        total_seconds += seconds
+        if seconds > 0:
+            rates.append(bits / seconds)
+    peak = int(max(rates)) if rates else 0
+    average = int(total_bits / total_seconds) if total_seconds else 0
+    return peak, average
+
+def write_master(output_dir, ladder):
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for rung in sorted(ladder, key=lambda r: r["bitrate"]):
+        playlist = os.path.join(output_dir, rung["name"], "index.m3u8")
+        peak, average = rung_bandwidth(playlist)
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={peak},AVERAGE-BANDWIDTH={average},CODECS="{CODECS}"')
+        lines.append(f"{rung['name']}/index.m3u8")
+    path = os.path.join(output_dir, MASTER_PLAYLIST)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+def write_segment_map(output_dir, cuts, index):
+    # Chunk number for every transcript line, so a seek can go straight
+    # to the chunk that holds it
+    boundaries = [0.0, *cuts]
+    lines = [bisect_right(boundaries, start) - 1 for start in index.starts]
+    path = os.path.join(output_dir, SEGMENT_MAP)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"boundaries": boundaries, "lines": lines}, f, separators=(",", ":"))
+    return path
+
+def package(input_audio=INPUT_AUDIO, transcript_file=TRANSCRIPT_FILE, output_dir=OUTPUT_DIR, ladder=LADDER,
+            workers=DEFAULT_WORKERS, force=False, snap_pauses=False, manifest=None):
+    t0 = time.perf_counter()
+    index = TranscriptIndex.load(transcript_file)
+    starts = list(index.starts)
+    if snap_pauses:
+        from pause_index import PauseIndex
+        pauses = PauseIndex.load(input_audio)
+        starts = [pauses.snap(s, max_shift=1.0) for s in starts]
+    cuts = plan_boundaries(starts, episode_duration(input_audio))
+    print(f"{len(index)} transcript lines -> {len(cuts) + 1} chunks")
+
+    os.makedirs(output_dir, exist_ok=True)
+    if manifest is None:
+        manifest = BuildManifest()
+    inputs = [input_audio, transcript_file]
+    cuts_hash = params_hash(cuts)
+    stale = []
+    for rung in ladder:
+        playlist = os.path.join(output_dir, rung["name"], "index.m3u8")
+        if not force and manifest.is_fresh(playlist, inputs, {**rung, "cuts": cuts_hash}):
+            print(f"Up to date: {playlist}")
+        else:
+            stale.append(rung)
+
+    built = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(stale) or 1))) as pool:
+        futures = [(rung, pool.submit(render_rung, input_audio, rung, cuts, output_dir)) for rung in stale]
+        for rung, future in futures:
+            try:
+                playlist = future.result()
+                manifest.record(playlist, inputs, {**rung, "cuts": cuts_hash})
+                built.append(rung["name"])
+                print(f"Created {playlist}")
+            except (RuntimeError, OSError) as e:
+                print(f"Failed to create rendition {rung['name']}: {e}")
+    manifest.save()
+
+    ready = [r for r in ladder if os.path.exists(os.path.join(output_dir, r["name"], "index.m3u8"))]
+    if ready:
+        print(f"Created {write_master(output_dir, ready)}")
+    write_segment_map(output_dir, cuts, index)
+    print(f"Packaged {len(built)} rendition(s) in {time.perf_counter() - t0:.2f}s")
+    return {"chunks": len(cuts) + 1, "built": built}
+
+def main():
+    parser = argparse.ArgumentParser(description="Package the episode as HLS with a bitrate ladder aligned to the transcript")
+    parser.add_argument("--input", default=INPUT_AUDIO)
+    parser.add_argument("--transcript", default=TRANSCRIPT_FILE)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--rungs", nargs="+", choices=[r["name"] for r in LADDER],
+                        help="Only build these renditions (default: all)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Renditions encoded at once")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if up to date")
+    parser.add_argument("--snap-pauses", action="store_true",
+                        help="Move chunk boundaries to the nearest pause (within 1s) of each line start")
+    args = parser.parse_args()
+
+    ladder = [r for r in LADDER if not args.rungs or r["name"] in args.rungs]
+    package(args.input, args.transcript, args.output_dir, ladder, args.workers, args.force, args.snap_pauses)
+
+if __name__ == "__main__":
+    with metrics.run("hls_package"):
+        main()
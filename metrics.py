@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+# Per-stage timing, byte counts and optional memory/CPU profiles, appended
+# as one JSON line per span:
+#   {"run": ..., "script": ..., "stage": "t2a", "seconds": 1.84, "bytes": 52644, ...}
+# The log only grows while it is switched on: METRICS=1 writes it to
+# .cache/metrics.jsonl, METRICS_FILE=<path> writes it elsewhere.
+# METRICS_TRACEMALLOC=1 adds memory deltas and peaks, METRICS_PROFILE=<dir>
+# saves a cProfile per run. `python metrics.py summary` reports p50/p95/p99
+# per stage.
+METRICS_FILE = os.getenv("METRICS_FILE") or os.path.abspath(".cache/metrics.jsonl")
+ENABLED = os.getenv("METRICS") == "1" or bool(os.getenv("METRICS_FILE"))
+TRACEMALLOC = os.getenv("METRICS_TRACEMALLOC") == "1"
+PROFILE_DIR = os.getenv("METRICS_PROFILE")
+PERCENTILES = (50, 95, 99)
+
+_lock = threading.Lock()
+_local = threading.local()
+_context = {"run": uuid.uuid4().hex[:12], "script": os.path.basename(sys.argv[0] or "python")}
+
+def emit(record):
+    if not ENABLED:
+        return
+    line = json.dumps({**_context, "at": time.time(), **record}, ensure_ascii=False, default=str)
+    with _lock:
+        os.makedirs(os.path.dirname(METRICS_FILE) or ".", exist_ok=True)
+        with open(METRICS_FILE, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+class Span:
+    def __init__(self, stage, fields):
+        self.stage = stage
+        self.fields = fields
+        self.bytes = 0
+
+    def add_bytes(self, n):
+        self.bytes += n
+        return n
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+@contextmanager
+def span(stage, **fields):
+    # Times the block; the yielded Span takes byte counts and extra fields
+    s = Span(stage, fields)
+    depth = getattr(_local, "depth", 0)
+    _local.depth = depth + 1
+    tracing = tracemalloc.is_tracing()
+    # The peak is process-wide, so only outermost main-thread spans own it
+    owns_peak = tracing and depth == 0 and threading.current_thread() is threading.main_thread()
+    if tracing:
+        mem_start = tracemalloc.get_traced_memory()[0]
+        if owns_peak:
+            tracemalloc.reset_peak()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield s
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        record = {"stage": stage, "seconds": time.perf_counter() - start, "bytes": s.bytes,
+                  "ok": error is None, **s.fields}
+        if error:
+            record["error"] = error
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            record["mem_delta"] = current - mem_start
+            if owns_peak:
+                record["mem_peak"] = peak
+        _local.depth = depth
+        emit(record)
+
+@contextmanager
+def run(script):
+    # Wraps a script's work: names its records, starts tracemalloc/cProfile
+    # if enabled, and records the whole run as the "run" stage
+    _context["script"] = script
+    if TRACEMALLOC and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    profiler = None
+    if PROFILE_DIR:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with span("run"):
+            yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{script}_{_context['run']}.prof")
+            profiler.dump_stats(path)
+            print(f"Profile saved to {path} (view with: python -m pstats {path})")
+
+def percentile(sorted_values, p):
+    # Linear interpolation between closest ranks
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def load(path=METRICS_FILE, script=None, run_id=None, since=None):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue # A line cut short by a crash
+            if script and rec.get("script") != script:
+                continue
+            if run_id and rec.get("run") != run_id:
+                continue
+            if since and rec.get("at", 0) < since:
+                continue
+            records.append(rec)
+    return records
+
+def summarize(records):
+    stages = {}
+    for rec in records:
+        stages.setdefault(rec["stage"], []).append(rec)
+    summary = {}
+    for stage, recs in stages.items():
+        seconds = sorted(r["seconds"] for r in recs)
+        total_bytes = sum(r.get("bytes", 0) for r in recs)
+        total_seconds = sum(seconds)
+        summary[stage] = {
+            "count": len(recs),
+            "errors": sum(1 for r in recs if not r.get("ok", True)),
+            "total": total_seconds,
+            **{f"p{p}": percentile(seconds, p) for p in PERCENTILES},
+            "max": seconds[-1],
+            "bytes": total_bytes,
+            "mb_per_s": total_bytes / total_seconds / 1e6 if total_seconds else 0.0,
+            "mem_peak": max((r["mem_peak"] for r in recs if "mem_peak" in r), default=None)
+        }
+    return summary
+
+def print_summary(summary):
+    print(f"{'stage':<16}{'count':>7}{'err':>5}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}{'total':>10}{'MB':>10}{'MB/s':>8}")
+    for stage, s in sorted(summary.items(), key=lambda kv: kv[1]["total"], reverse=True):
+        print(f"{stage:<16}{s['count']:>7}{s['errors']:>5}{s['p50']:>10.3f}{s['p95']:>10.3f}{s['p99']:>10.3f}"
+              f"{s['max']:>10.3f}{s['total']:>10.2f}{s['bytes'] / 1e6:>10.2f}{s['mb_per_s']:>8.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency percentiles from the metrics log")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary = sub.add_parser("summary", help="Print p50/p95/p99 per stage")
+    summary.add_argument("file", nargs="?", default=METRICS_FILE)
+    summary.add_argument("--script", help="Only records from this script")
+    summary.add_argument("--run", help="Only records from this run ID")
+    summary.add_argument("--last", type=float, help="Only records from the last N hours")
+    summary.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    since = time.time() - args.last * 3600 if args.last else None
+    records = load(args.file, args.script, args.run, since)
+    if not records:
+        print(f"No metrics in {args.file}")
+        return
+    result = summarize(records)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_summary(result)
+
+if __name__ == "__main__":
+    main()
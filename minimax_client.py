@@ -0,0 +1,389 @@
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+# Override with MINIMAX_BASE_URL, e.g. to point at mock_server.py
+BASE_URL = os.getenv("MINIMAX_BASE_URL", "https://api.minimaxi.com")
+T2A_PATH = "/v1/t2a_v2"
+UPLOAD_PATH = "/v1/files/upload"
+CLONE_PATH = "/v1/voice_clone"
+DEFAULT_MODEL = "speech-2.6-hd"
+DEFAULT_VOICE_ID = "tim_clone_v1"
+DEFAULT_AUDIO_SETTING = {
+    "sample_rate": 32000,
+    "bitrate": 128000,
+    "format": "mp3",
+    "channel": 1
+}
+
+# The voices and settings generateT2A in src/routes/api/interact/+server.ts
+# uses, shared by the synthesis service and the cache warmer
+LUO_VOICE_ID = "luo_yonghao_clone_v1"
+TIM_VOICE_ID = DEFAULT_VOICE_ID
+ROUTE_SETTINGS = {"emotion": "happy"}
+
+POOL_SIZE = 16
+DEFAULT_CONCURRENCY = 10
+MAX_RETRIES = 4
+BACKOFF_BASE = 0.5 # Seconds; doubled on every retry, with jitter
+TIMEOUT = 120
+STREAM_CHUNK = 1 << 16 # Read size for event streams and for streams served from the cache
+
+# HTTP statuses and base_resp.status_code values worth retrying:
+# rate limits, timeouts and server-side errors
+RETRY_HTTP_STATUS = {408, 429, 500, 502, 503, 504}
+RETRY_API_STATUS = {1000, 1001, 1002, 1024, 1033, 1039}
+
+def voice_for(speaker):
+    # The route's voice for a dialogue speaker
+    return LUO_VOICE_ID if "罗永浩" in speaker else TIM_VOICE_ID
+
+def thread_pool(concurrency):
+    # Threads for blocking t2a calls made from asyncio. asyncio.to_thread
+    # would use the loop's default executor, capped at min(32, cpu + 4)
+    # threads, which stalls the fan-out below `concurrency` on small machines.
+    return ThreadPoolExecutor(max_workers=max(1, concurrency))
+
+class MiniMaxError(Exception):
+    def __init__(self, message, http_status=None, status_code=None, retryable=False):
+        super().__init__(message)
+        self.http_status = http_status
+        self.status_code = status_code
+        self.retryable = retryable
+
+def load_api_key():
+    load_dotenv()
+    api_key = os.getenv("MINIMAX_API_KEY")
+    if not api_key:
+        print("Error: MINIMAX_API_KEY not found in environment variables.")
+        exit(1)
+    return api_key
+
+def find_url(obj):
+    # Recursive search for an audio URL in a response
+    if isinstance(obj, str):
+        # URL might contain query params, so endswith check is insufficient
+        if obj.startswith("http") and (".mp3" in obj or ".wav" in obj):
+            return obj
+    elif isinstance(obj, dict):
+        for k, v in obj.items():
+            if k in ["url", "audio_file", "file_url", "audio_url", "demo_audio"]: # frequent keys
+                if isinstance(v, str) and v.startswith("http"):
+                    return v
+            res = find_url(v)
+            if res: return res
+    elif isinstance(obj, list):
+        for item in obj:
+            res = find_url(item)
+            if res: return res
+    return None
+
+def build_t2a_payload(text, voice_id=DEFAULT_VOICE_ID, emotion=None, speed=1, vol=1, pitch=0,
+                      model=DEFAULT_MODEL, audio_setting=None, stream=False, output_format=None):
+    voice_setting = {
+        "voice_id": voice_id,
+        "speed": speed,
+        "vol": vol,
+        "pitch": pitch
+    }
+    if emotion:
+        voice_setting["emotion"] = emotion
+    payload = {
+        "model": model,
+        "text": text,
+        "stream": stream,
+        "voice_setting": voice_setting,
+        "audio_setting": dict(audio_setting or DEFAULT_AUDIO_SETTING)
+    }
+    if output_format:
+        payload["output_format"] = output_format # "hex" (default) or "url"
+    return payload
+
+class MiniMaxClient:
+    # One pooled HTTP session shared by every request, with retries driven by
+    # both the HTTP status and MiniMax's own base_resp.status_code
+
+    def __init__(self, api_key=None, base_url=BASE_URL, pool_size=POOL_SIZE,
+                 max_retries=MAX_RETRIES, backoff=BACKOFF_BASE, timeout=TIMEOUT, cache=None):
+        self.api_key = api_key or load_api_key()
+        self.cache = cache # Optional tts_cache.TTSCache consulted before every t2a call
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _sleep_before_retry(self, attempt):
+        time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    def _check(self, response):
+        if response.status_code >= 400:
+            raise MiniMaxError(f"HTTP {response.status_code}: {response.text[:200]}",
+                               http_status=response.status_code,
+                               retryable=response.status_code in RETRY_HTTP_STATUS)
+        data = response.json()
+        base_resp = data.get("base_resp") or {}
+        status_code = base_resp.get("status_code", 0)
+        if status_code != 0:
+            raise MiniMaxError(f"API Error: {base_resp}", http_status=response.status_code,
+                               status_code=status_code, retryable=status_code in RETRY_API_STATUS)
+        return data
+
+    def request(self, method, path, **kwargs):
+        # Returns the decoded JSON body, retrying transient failures
+        url = path if path.startswith("http") else self.base_url + path
+        kwargs.setdefault("timeout", self.timeout)
+        with metrics.span("http", path=path if not path.startswith("http") else "url") as span:
+            for attempt in range(self.max_retries + 1):
+                span.set(attempts=attempt + 1)
+                try:
+                    response = self.session.request(method, url, **kwargs)
+                    span.add_bytes(len(response.content))
+                    return self._check(response)
+                except MiniMaxError as e:
+                    if not e.retryable or attempt == self.max_retries:
+                        raise
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt == self.max_retries:
+                        raise MiniMaxError(f"Network error: {e}") from e
+                self._sleep_before_retry(attempt)
+
+    def post_json(self, path, payload):
+        return self.request("POST", path, json=payload)
+
+    def download(self, url):
+        with metrics.span("download") as span:
+            r = self.session.get(url, timeout=self.timeout)
+            r.raise_for_status()
+            span.add_bytes(len(r.content))
+            return r.content
+
+    def upload_file(self, file_path, purpose="voice_clone"):
+        print(f"Uploading {file_path} for {purpose}...")
+        with open(file_path, "rb") as f:
+            content = f.read() # Held in memory so a retry can resend it
+        with metrics.span("upload", purpose=purpose) as span:
+            span.add_bytes(len(content))
+            result = self.request("POST", UPLOAD_PATH, data={"purpose": purpose},
+                                  files={"file": (os.path.basename(file_path), content)})
+        file_id = result.get("file", {}).get("file_id")
+        if not file_id:
+            raise MiniMaxError(f"Upload returned no file_id: {result}")
+        print(f"Upload successful. File ID: {file_id}")
+        return file_id
+
+    def voice_clone(self, file_id, voice_id, text=None, model=DEFAULT_MODEL):
+        # With `text`, the response also carries a demo clip in the new voice
+        print(f"Cloning voice {voice_id}...")
+        payload = {"file_id": file_id, "voice_id": voice_id}
+        if text:
+            payload["text"] = text
+            payload["model"] = model
+        with metrics.span("clone", voice_id=voice_id):
+            return self.post_json(CLONE_PATH, payload)
+
+    def audio_from_response(self, data):
+        # Hex audio inline, or a URL to fetch it from
+        if "data" in data and data["data"] and data["data"].get("audio"):
+            audio = data["data"]["audio"]
+            if audio.startswith("http"): # output_format: "url"
+                return self.download(audio)
+            with metrics.span("hex_decode") as span:
+                audio = bytes.fromhex(audio)
+                span.add_bytes(len(audio))
+            return audio
+        url = find_url(data)
+        if url:
+            return self.download(url)
+        raise MiniMaxError("Unknown response format.")
+
+    def t2a(self, text, **settings):
+        settings.pop("stream", None)
+        payload = build_t2a_payload(text, **settings)
+        with metrics.span("t2a", chars=len(text), cached=False) as span:
+            if self.cache is not None:
+                audio = self.cache.get(payload)
+                if audio is not None:
+                    span.set(cached=True)
+                    span.add_bytes(len(audio))
+                    return audio
+            audio = self.audio_from_response(self.post_json(T2A_PATH, payload))
+            span.add_bytes(len(audio))
+        if self.cache is not None:
+            self.cache.put(payload, audio)
+        return audio
+
+    def t2a_to_file(self, text, output_filename, **settings):
+        if settings.pop("chunked", False):
+            import chunked_tts # Imports this module
+            settings.pop("stream", None)
+            stats = chunked_tts.synthesize_to_file(self, text, output_filename, **settings)
+            print(f"{output_filename}: {stats['chunks']} chunks, first audio after {stats['ttfa']:.2f}s, "
+                  f"{stats['duration']:.2f}s of audio in {stats['total']:.2f}s")
+            return output_filename
+        if settings.pop("stream", False):
+            stats = self.t2a_stream(text, output_filename, **settings)
+            print(f"{output_filename}: first audio byte after {stats['ttfb']:.2f}s, "
+                  f"{stats['bytes']} bytes in {stats['total']:.2f}s")
+            return output_filename
+        audio = self.t2a(text, **settings)
+        with metrics.span("file_write") as span:
+            with open(output_filename, "wb") as f:
+                span.add_bytes(f.write(audio))
+        return output_filename
+
+    def _iter_stream_events(self, response):
+        # Server-sent events: one "data: {json}" line per chunk. iter_lines
+        # re-joins a line across reads, so a small read size is quadratic in
+        # the length of a long event.
+        for line in response.iter_lines(chunk_size=STREAM_CHUNK):
+            if not line.startswith(b"data:"):
+                continue
+            event = json.loads(line[5:])
+            base_resp = event.get("base_resp") or {}
+            status_code = base_resp.get("status_code", 0)
+            if status_code != 0:
+                raise MiniMaxError(f"API Error: {base_resp}", status_code=status_code,
+                                   retryable=status_code in RETRY_API_STATUS)
+            yield event
+
+    def t2a_stream(self, text, output_filename, on_chunk=None, **settings):
+        # Streams synthesis straight into the output file, hex-decoding each
+        # chunk as it arrives. Returns timing stats including time to the
+        # first audio byte. Retries are only possible before audio is written.
+        settings.pop("stream", None)
+        payload = build_t2a_payload(text, stream=True, **settings)
+        # Without this the closing event repeats the whole clip as one hex line
+        payload["stream_options"] = {"exclude_aggregated_audio": True}
+        start = time.perf_counter()
+
+        cached = self.cache.lookup(payload) if self.cache is not None else None
+        if cached is not None:
+            # Copied block by block, like the live stream, so memory stays at one chunk
+            written = 0
+            ttfb = None
+            with open(cached, "rb") as src, open(output_filename, "wb") as f:
+                for chunk in iter(lambda: src.read(STREAM_CHUNK), b""):
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - start
+                    f.write(chunk)
+                    written += len(chunk)
+                    if on_chunk:
+                        on_chunk(chunk)
+            elapsed = time.perf_counter() - start
+            metrics.emit({"stage": "t2a_stream", "seconds": elapsed, "bytes": written, "ok": True,
+                          "ttfb": ttfb, "chars": len(text), "cached": True})
+            return {"ttfb": ttfb, "total": elapsed, "bytes": written, "cached": True}
+
+        for attempt in range(self.max_retries + 1):
+            written = 0
+            ttfb = None
+            try:
+                with self.session.post(self.base_url + T2A_PATH, json=payload, stream=True,
+                                       timeout=self.timeout) as response:
+                    if response.status_code >= 400:
+                        raise MiniMaxError(f"HTTP {response.status_code}: {response.text[:200]}",
+                                           http_status=response.status_code,
+                                           retryable=response.status_code in RETRY_HTTP_STATUS)
+                    if response.headers.get("Content-Type", "").startswith("application/json"):
+                        # Errors come back as a plain JSON body rather than events
+                        self._check(response)
+                        raise MiniMaxError("Expected an event stream, got JSON.")
+                    with open(output_filename, "wb") as f:
+                        carry = ""
+                        for event in self._iter_stream_events(response):
+                            data = event.get("data") or {}
+                            # The closing event (status 2) would repeat the whole clip
+                            if data.get("status") == 2:
+                                break
+                            hex_chunk = carry + (data.get("audio") or "")
+                            # Keep an odd trailing nibble for the next chunk
+                            carry = hex_chunk[len(hex_chunk) & ~1:]
+                            chunk = bytes.fromhex(hex_chunk[:len(hex_chunk) & ~1])
+                            if not chunk:
+                                continue
+                            if ttfb is None:
+                                ttfb = time.perf_counter() - start
+                            f.write(chunk)
+                            written += len(chunk)
+                            if on_chunk:
+                                on_chunk(chunk)
+                break
+            except MiniMaxError as e:
+                if written or not e.retryable or attempt == self.max_retries:
+                    raise
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if written or attempt == self.max_retries:
+                    raise MiniMaxError(f"Network error: {e}") from e
+            self._sleep_before_retry(attempt)
+
+        if not written:
+            raise MiniMaxError("Stream ended without audio.")
+        total = time.perf_counter() - start
+        metrics.emit({"stage": "t2a_stream", "seconds": total, "bytes": written, "ok": True,
+                      "ttfb": ttfb, "chars": len(text), "cached": False})
+
+        if self.cache is not None:
+            self.cache.put_file(payload, output_filename)
+
+        return {"ttfb": ttfb, "total": total, "bytes": written, "cached": False}
+
+    async def t2a_batch(self, items, concurrency=DEFAULT_CONCURRENCY):
+        # items: dicts of t2a settings with "text" and "output". Runs at most
+        # `concurrency` requests at once; returns one result per item, in
+        # order, holding either the output path or the exception raised.
+        semaphore = asyncio.Semaphore(concurrency)
+        loop = asyncio.get_running_loop()
+        pool = thread_pool(concurrency)
+
+        async def run(item):
+            settings = {k: v for k, v in item.items() if k not in ("text", "output")}
+            async with semaphore:
+                try:
+                    path = await loop.run_in_executor(
+                        pool, partial(self.t2a_to_file, item["text"], item["output"], **settings))
+                    print(f"Success: {path}")
+                    return path
+                except Exception as e:
+                    print(f"Failed {item['output']}: {e}")
+                    return e
+
+        try:
+            return await asyncio.gather(*(run(item) for item in items))
+        finally:
+            pool.shutdown(wait=False)
+
+    def synthesize_batch(self, items, concurrency=DEFAULT_CONCURRENCY):
+        start = time.perf_counter()
+        results = asyncio.run(self.t2a_batch(items, concurrency))
+        failed = sum(1 for r in results if isinstance(r, Exception))
+        print(f"Generated {len(results) - failed}/{len(results)} clips in {time.perf_counter() - start:.2f}s")
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(f"TTS cache: {stats['hits']} hits, {stats['misses']} misses"
+                  + (" (bypassed)" if stats['bypass'] else ""))
+        return results
@@ -0,0 +1,253 @@
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+# Offline stand-in for the MiniMax and Doubao endpoints the scripts and
+# routes call. Point MINIMAX_BASE_URL / DOUBAO_BASE_URL at it, e.g.
+#   python mock_server.py --port 8788 --latency 300 --error-rate 0.05
+#   MINIMAX_BASE_URL=http://127.0.0.1:8788 DOUBAO_BASE_URL=http://127.0.0.1:8788 ...
+DEFAULT_PORT = 8788
+
+# A silent MPEG-1 Layer III frame: 128 kbps, 32 kHz, mono -> 576 bytes, 36 ms
+FRAME_HEADER = bytes([0xFF, 0xFB, 0x98, 0xC4])
+FRAME_SIZE = 576
+FRAME_SECONDS = 1152 / 32000
+MAX_FILES = 256 # Download URLs kept; older ones expire, as real ones do
+
+def silent_mp3(seconds):
+    frames = max(1, int(round(seconds / FRAME_SECONDS)))
+    return (FRAME_HEADER + bytes(FRAME_SIZE - len(FRAME_HEADER))) * frames
+
+class MockConfig:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, api_error_rate=0.0,
+                 seconds_per_char=0.2, audio_seconds=None, stream_chunks=8, ttfb=None):
+        self.latency = latency                   # Seconds before any response
+        self.jitter = jitter                     # +/- uniform noise on the latency
+        self.error_rate = error_rate             # Share of HTTP 500 responses
+        self.api_error_rate = api_error_rate     # Share of base_resp 1002 (rate limit) responses
+        self.seconds_per_char = seconds_per_char # Synthesized audio length per character of text
+        self.audio_seconds = audio_seconds       # Fixed audio length, overrides seconds_per_char
+        self.stream_chunks = stream_chunks
+        self.ttfb = ttfb                         # Stream delay before the first chunk (default: latency / 4)
+
+    def delay(self):
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+    def audio_for(self, text):
+        seconds = self.audio_seconds if self.audio_seconds is not None else len(text) * self.seconds_per_char
+        return silent_mp3(seconds)
+
+class MockState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = OrderedDict() # Served under /files/<name>, oldest first
+        self.voices = set()
+        self.requests = {}  # Per-path request counters
+
+    def count(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def add_file(self, name, audio):
+        with self.lock:
+            self.files[name] = audio
+            while len(self.files) > MAX_FILES:
+                self.files.popitem(last=False)
+
+    def get_file(self, name):
+        with self.lock:
+            return self.files.get(name)
+
+def make_handler(config, state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, content_type="application/json"):
+            if isinstance(body, (dict, list)):
+                body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _ok(self, data):
+            data["base_resp"] = {"status_code": 0, "status_msg": "success"}
+            self._send(200, data)
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length", 0))
+            return self.rfile.read(length) if length else b""
+
+        def _maybe_fail(self, path):
+            time.sleep(config.delay())
+            roll = random.random()
+            if roll < config.error_rate:
+                self._send(500, {"error": "injected server error"})
+                return True
+            if roll < config.error_rate + config.api_error_rate:
+                if path.endswith("/chat/completions"):
+                    # Doubao reports rate limits through the HTTP status
+                    self._send(429, {"error": {"code": "RateLimitExceeded", "message": "rate limit (injected)"}})
+                else:
+                    self._send(200, {"base_resp": {"status_code": 1002, "status_msg": "rate limit (injected)"}})
+                return True
+            return False
+
+        def _host(self):
+            return f"http://{self.headers.get('Host', '127.0.0.1')}"
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            state.count(path)
+            audio = state.get_file(path.rsplit("/", 1)[-1]) if path.startswith("/files/") else None
+            if audio is not None:
+                return self._send(200, audio, "audio/mpeg")
+            if path == "/stats":
+                with state.lock:
+                    return self._send(200, {"requests": dict(state.requests), "voices": sorted(state.voices)})
+            self._send(404, {"error": f"not found: {path}"})
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            state.count(path)
+            body = self._read_body()
+            if self._maybe_fail(path):
+                return
+            routes = {
+                "/v1/files/upload": self._upload,
+                "/v1/voice_clone": self._voice_clone,
+                "/v1/t2a_v2": self._t2a,
+                "/chat/completions": self._chat,
+                "/api/v3/chat/completions": self._chat,
+            }
+            handler = routes.get(path)
+            if handler is None:
+                return self._send(404, {"error": f"not found: {path}"})
+            handler(body)
+
+        def _upload(self, body):
+            self._ok({"file": {"file_id": random.randint(10 ** 9, 10 ** 10), "bytes": len(body),
+                               "created_at": int(time.time()), "purpose": "voice_clone"}})
+
+        def _voice_clone(self, body):
+            payload = json.loads(body or b"{}")
+            with state.lock:
+                state.voices.add(payload.get("voice_id"))
+            data = {"input_sensitive": False}
+            if payload.get("text"):
+                name = f"demo_{uuid.uuid4().hex}.mp3"
+                state.add_file(name, config.audio_for(payload["text"]))
+                data["demo_audio"] = f"{self._host()}/files/{name}"
+            self._ok(data)
+
+        def _t2a(self, body):
+            payload = json.loads(body or b"{}")
+            text = payload.get("text", "")
+            audio = config.audio_for(text)
+            extra = {
+                "audio_length": int(len(audio) // FRAME_SIZE * FRAME_SECONDS * 1000),
+                "audio_size": len(audio),
+                "audio_format": "mp3"
+            }
+            if payload.get("stream"):
+                aggregate = not (payload.get("stream_options") or {}).get("exclude_aggregated_audio")
+                return self._t2a_stream(audio, extra, aggregate)
+            if payload.get("output_format") == "url":
+                name = f"t2a_{uuid.uuid4().hex}.mp3"
+                state.add_file(name, audio)
+                return self._ok({"data": {"audio": f"{self._host()}/files/{name}", "status": 2}, "extra_info": extra})
+            self._ok({"data": {"audio": audio.hex(), "status": 2}, "extra_info": extra})
+
+        def _t2a_stream(self, audio, extra, aggregate=True):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send(event):
+                line = b"data: " + json.dumps(event).encode("utf-8") + b"\n\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+
+            chunks = max(1, config.stream_chunks)
+            step = -(-len(audio) // chunks)
+            first_delay = config.ttfb if config.ttfb is not None else config.latency / 4
+            time.sleep(first_delay)
+            for i in range(0, len(audio), step):
+                send({"data": {"audio": audio[i:i + step].hex(), "status": 1},
+                      "base_resp": {"status_code": 0, "status_msg": ""}})
+                time.sleep(config.latency / chunks)
+            # Like the real API, the closing event repeats the complete clip
+            # unless stream_options.exclude_aggregated_audio is set
+            send({"data": {"audio": audio.hex() if aggregate else "", "status": 2}, "extra_info": extra,
+                  "base_resp": {"status_code": 0, "status_msg": "success"}})
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _chat(self, body):
+            payload = json.loads(body or b"{}")
+            prompt = "".join(m.get("content", "") for m in payload.get("messages", []) if isinstance(m.get("content"), str))
+            current = re.search(r"当前编号：(\d+)", prompt)
+            if current:
+                content = f"【{int(current.group(1)) + 2}】"
+            else:
+                content = json.dumps({"dialogue": [
+                    {"speaker": "罗永浩", "content": "刚刚有一个观众提问，我觉得挺有意思的，Tim你怎么看？"},
+                    {"speaker": "Tim", "content": "这个问题其实我们内部也讨论过，我觉得核心还是内容本身。"}
+                ]}, ensure_ascii=False)
+            self._send(200, {
+                "id": f"mock-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "model": payload.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(content), "total_tokens": len(prompt) + len(content)}
+            })
+
+    return Handler
+
+def serve(port=DEFAULT_PORT, config=None, host="127.0.0.1"):
+    # Starts the server on a background thread and returns it; port 0 picks a free port
+    server = ThreadingHTTPServer((host, port), make_handler(config or MockConfig(), MockState()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Local MiniMax / Doubao stand-in for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency", type=float, default=0.0, help="Response latency in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Latency jitter in ms")
+    parser.add_argument("--ttfb", type=float, default=None, help="Stream time to first chunk in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of HTTP 500 responses")
+    parser.add_argument("--api-error-rate", type=float, default=0.0, help="Share of base_resp 1002 responses")
+    parser.add_argument("--seconds-per-char", type=float, default=0.2, help="Audio length per character of text")
+    parser.add_argument("--audio-seconds", type=float, default=None, help="Fixed audio length for every response")
+    parser.add_argument("--stream-chunks", type=int, default=8)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency / 1000, jitter=args.jitter / 1000,
+        error_rate=args.error_rate, api_error_rate=args.api_error_rate,
+        seconds_per_char=args.seconds_per_char, audio_seconds=args.audio_seconds,
+        stream_chunks=args.stream_chunks, ttfb=None if args.ttfb is None else args.ttfb / 1000
+    )
+    server = serve(args.port, config, args.host)
+    print(f"Mock MiniMax/Doubao server on http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+import argparse
+import json
+import os
+import struct
+from collections import namedtuple
+from functools import lru_cache
+
+# MPEG audio frame parsing without decoding: frame boundaries, exact
+# duration from the Xing/Info (or VBRI) header and the LAME encoder
+# delay/padding, and concatenation at frame boundaries.
+
+# Bitrates in kbps by (MPEG-1?, layer), indexed by the 4-bit bitrate field
+BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+VERSIONS = {0b00: 2.5, 0b10: 2, 0b11: 1}
+LAYERS = {0b01: 3, 0b10: 2, 0b11: 1}
+
+XING_FRAMES, XING_BYTES, XING_TOC, XING_QUALITY = 1, 2, 4, 8
+LAME_TAG_SIZE = 36
+MAX_TRIM = 0xFFF # Largest encoder delay or padding the 12-bit LAME fields hold
+VBRI_OFFSET = 36
+
+Header = namedtuple("Header", "version layer bitrate sample_rate channels size samples side_info")
+
+@lru_cache(maxsize=4096)
+def _decode(b1, b2, b3):
+    version = VERSIONS.get((b1 >> 3) & 0b11)
+    layer = LAYERS.get((b1 >> 1) & 0b11)
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 0b11
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None # Reserved values, or free format which has no fixed frame size
+    mpeg1 = version == 1
+    bitrate = BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 1
+    channels = 1 if (b3 >> 6) == 0b11 else 2
+    if layer == 1:
+        samples = 384
+        size = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        size = samples // 8 * bitrate // sample_rate + padding
+    if layer == 3:
+        side_info = (32 if channels == 2 else 17) if mpeg1 else (17 if channels == 2 else 9)
+    else:
+        side_info = 0
+    return Header(version, layer, bitrate, sample_rate, channels, size, samples, side_info)
+
+def parse_header(data, offset):
+    # The frame header at `offset`, or None if there is no valid one
+    if offset + 4 > len(data) or data[offset] != 0xFF or data[offset + 1] & 0xE0 != 0xE0:
+        return None
+    return _decode(data[offset + 1], data[offset + 2], data[offset + 3])
+
+def main_data_begin(data, offset, header):
+    # Bytes of this frame's main data that sit in earlier frames (the Layer
+    # III bit reservoir); 0 for Layers I and II, which have no reservoir
+    if header.layer != 3:
+        return 0
+    p = offset + (4 if data[offset + 1] & 1 else 6) # Side info follows the CRC, if any
+    if header.version == 1:
+        return (data[p] << 1) | (data[p + 1] >> 7)
+    return data[p]
+
+def main_data_start(data, offset, header):
+    # Start of the frame's main data area, after header, CRC and side info
+    return offset + (4 if data[offset + 1] & 1 else 6) + header.side_info
+
+def _frame_crc(frame, side_info):
+    # CRC-16 (poly 0x8005, init 0xFFFF) over header bytes 2-3 and the side
+    # info, as stored after the header of protected frames
+    crc = 0xFFFF
+    for byte in bytes(frame[2:4]) + bytes(frame[6:6 + side_info]):
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005 if crc & 0x8000 else crc << 1) & 0xFFFF
+    return crc
+
+def grow_frame(frame, extra):
+    # The frame re-labelled with the lowest higher bitrate that makes it at
+    # least `extra` bytes larger, zero-filled at the end of its main data
+    # area. Only safe for a frame that no later frame borrows bytes from.
+    b1, b2, b3 = frame[1], frame[2], frame[3]
+    for index in range((b2 >> 4) + 1, 15):
+        header = _decode(b1, (b2 & 0x0F) | (index << 4), b3)
+        if header is None or header.size - len(frame) < extra:
+            continue
+        grown = bytearray(frame)
+        grown[2] = (b2 & 0x0F) | (index << 4)
+        grown += bytes(header.size - len(frame))
+        if not b1 & 1:
+            grown[4:6] = _frame_crc(grown, header.side_info).to_bytes(2, "big")
+        return bytes(grown)
+    raise ValueError(f"No bitrate leaves {extra} more bytes in this frame")
+
+def silent_frame(first_header_bytes, reservoir=b""):
+    # A Layer III frame like the stream's first that decodes to silence
+    # (zeroed side info, main_data_begin 0) and ends with `reservoir`, so
+    # the frames after it can take those bytes as their bit reservoir
+    raw, h = _info_header(first_header_bytes, 0)
+    raw, h = _info_header(first_header_bytes, 4 + h.side_info + len(reservoir))
+    frame = bytearray(h.size)
+    frame[:4] = raw
+    frame[h.size - len(reservoir):] = reservoir
+    return bytes(frame)
+
+def _synchsafe(b):
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+def audio_bounds(data):
+    # Byte range of the MPEG stream: after any leading ID3v2 tags and
+    # before any trailing APEv2 / ID3v1 tags
+    start = 0
+    while data[start:start + 3] == b"ID3" and start + 10 <= len(data):
+        footer = 10 if data[start + 5] & 0x10 else 0
+        start += 10 + footer + _synchsafe(data[start + 6:start + 10])
+    end = len(data)
+    if end - start >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    if end - start >= 32 and data[end - 32:end - 24] == b"APETAGEX":
+        size, flags = struct.unpack_from("<II", data, end - 20)
+        end -= size + (32 if flags & 0x80000000 else 0)
+    return start, max(start, end)
+
+def iter_frames(data, start=None, end=None):
+    # (offset, header) for every complete frame, resynchronising past junk
+    if start is None or end is None:
+        bounds = audio_bounds(data)
+        start = bounds[0] if start is None else start
+        end = bounds[1] if end is None else end
+    pos = start
+    while pos + 4 <= end:
+        header = parse_header(data, pos)
+        if header is None:
+            pos = data.find(b"\xff", pos + 1, end)
+            if pos < 0:
+                return
+            continue
+        if pos + header.size > end:
+            return # Truncated last frame
+        yield pos, header
+        pos += header.size
+
+def read_vbr_header(data, offset, header):
+    # Xing/Info (LAME, ffmpeg) or VBRI (Fraunhofer) header in the first
+    # frame. Returns None if the frame holds audio.
+    frame = data[offset:offset + header.size]
+    x = 4 + header.side_info
+    tag = frame[x:x + 4]
+    if tag in (b"Xing", b"Info"):
+        info = {"kind": tag.decode(), "frames": None, "bytes": None, "toc": None, "delay": 0, "padding": 0}
+        flags = struct.unpack_from(">I", frame, x + 4)[0]
+        p = x + 8
+        if flags & XING_FRAMES:
+            info["frames"] = struct.unpack_from(">I", frame, p)[0]
+            p += 4
+        if flags & XING_BYTES:
+            info["bytes"] = struct.unpack_from(">I", frame, p)[0]
+            p += 4
+        if flags & XING_TOC:
+            info["toc"] = bytes(frame[p:p + 100])
+            p += 100
+        if flags & XING_QUALITY:
+            p += 4
+        lame = frame[p:p + LAME_TAG_SIZE]
+        if len(lame) == LAME_TAG_SIZE and lame[:4].isalpha():
+            info["encoder"] = lame[:9].rstrip(b"\x00 ").decode("ascii", "replace")
+            info["lame"] = bytes(lame)
+            info["delay"] = (lame[21] << 4) | (lame[22] >> 4)
+            info["padding"] = ((lame[22] & 0x0F) << 8) | lame[23]
+        return info
+    if frame[VBRI_OFFSET:VBRI_OFFSET + 4] == b"VBRI":
+        delay, _, size, frames = struct.unpack_from(">HHII", frame, VBRI_OFFSET + 6)
+        return {"kind": "VBRI", "frames": frames, "bytes": size, "toc": None, "delay": delay, "padding": 0}
+    return None
+
+def _load(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    with open(source, 'rb') as f:
+        return f.read()
+
+def probe(source, scan=False):
+    # Stream parameters and exact duration. The frame count comes from the
+    # VBR header when there is one, otherwise (or with scan=True) from
+    # walking every frame header; audio is never decoded.
+    data = _load(source)
+    start, end = audio_bounds(data)
+    frames = iter_frames(data, start, end)
+    first = next(frames, None)
+    if first is None:
+        raise ValueError("No MPEG audio frames found")
+    offset, header = first
+    vbr = read_vbr_header(data, offset, header)
+    audio_start = offset + header.size if vbr else offset
+
+    count = vbr["frames"] if vbr and vbr["frames"] is not None and not scan else None
+    audio_bytes = None
+    bitrates = set()
+    if count is None:
+        count = audio_bytes = 0
+        for pos, h in iter_frames(data, audio_start, end):
+            count += 1
+            audio_bytes += h.size
+            bitrates.add(h.bitrate)
+    elif vbr["bytes"]:
+        audio_bytes = max(0, vbr["bytes"] - (header.size if vbr["kind"] != "VBRI" else 0))
+
+    delay = vbr["delay"] if vbr else 0
+    padding = vbr["padding"] if vbr else 0
+    samples = max(0, count * header.samples - delay - padding)
+    duration = samples / header.sample_rate
+    if audio_bytes is None:
+        audio_bytes = end - audio_start
+    return {
+        "version": header.version,
+        "layer": header.layer,
+        "sample_rate": header.sample_rate,
+        "channels": header.channels,
+        "frames": count,
+        "samples_per_frame": header.samples,
+        "samples": samples,
+        "delay": delay,
+        "padding": padding,
+        "duration": duration,
+        "bitrate": int(audio_bytes * 8 / duration) if duration else 0,
+        "vbr_header": vbr["kind"] if vbr else None,
+        "encoder": vbr.get("encoder") if vbr else None,
+        "vbr": len(bitrates) > 1 if bitrates else (vbr is not None and vbr["kind"] in ("Xing", "VBRI")),
+        "audio_start": audio_start,
+        "audio_end": end
+    }
+
+def duration(source):
+    return probe(source)["duration"]
+
+def _crc16(data):
+    # CRC-16/ARC, as used for the LAME tag checksum
+    crc = 0
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+    return crc
+
+def _info_header(first, min_size):
+    # A header like `first` whose frame is large enough for the tag, using
+    # the stream's own bitrate when it fits so CBR files stay CBR
+    b1, b2, b3 = first
+    b1 |= 0x01 # No CRC
+    b2 &= ~0x02 & 0xFF # No padding
+    h = _decode(b1, b2, b3)
+    if h.size >= min_size:
+        return bytes([0xFF, b1, b2, b3]), h
+    for index in range(1, 15):
+        b2 = (b2 & 0x0F) | (index << 4)
+        h = _decode(b1, b2, b3)
+        if h.size >= min_size:
+            return bytes([0xFF, b1, b2, b3]), h
+    raise ValueError(f"No bitrate gives a frame of {min_size} bytes with these stream parameters")
+
+def build_info_frame(first_header_bytes, frame_sizes, frame_bitrates, delay=0, padding=0, lame=None):
+    # Xing/Info frame describing `frame_sizes` audio frames, with a seek
+    # TOC and, when `lame` (a source LAME tag) is given, encoder delay and
+    # padding for gapless playback
+    if lame is not None and not (0 <= delay <= MAX_TRIM and 0 <= padding <= MAX_TRIM):
+        raise ValueError(f"Encoder delay {delay} and padding {padding} must be within 0..{MAX_TRIM} for the LAME tag")
+    raw, h = _info_header(first_header_bytes, 4 + 32 + 8 + 4 + 4 + 100 + 4 + LAME_TAG_SIZE)
+    frame = bytearray(h.size)
+    frame[:4] = raw
+    x = 4 + h.side_info
+    total_bytes = h.size + sum(frame_sizes)
+
+    toc = bytearray(100)
+    if frame_sizes:
+        n = len(frame_sizes)
+        positions = []
+        pos = h.size
+        for size in frame_sizes:
+            positions.append(pos)
+            pos += size
+        for i in range(100):
+            toc[i] = min(255, positions[min(n - 1, i * n // 100)] * 256 // total_bytes)
+
+    kind = b"Xing" if len(set(frame_bitrates)) > 1 else b"Info"
+    struct.pack_into(">4sII", frame, x, kind, XING_FRAMES | XING_BYTES | XING_TOC | XING_QUALITY,
+                     len(frame_sizes))
+    struct.pack_into(">I", frame, x + 12, total_bytes)
+    frame[x + 16:x + 116] = toc
+    p = x + 120 # After the 4-byte quality field, left at 0
+    if lame is not None:
+        tag = bytearray(lame)
+        tag[11:19] = bytes(8) # Peak and replay gain no longer apply
+        tag[21:24] = bytes([delay >> 4, ((delay & 0x0F) << 4) | (padding >> 8), padding & 0xFF])
+        struct.pack_into(">IH", tag, 28, total_bytes, 0) # Music length; music CRC not computed
+        frame[p:p + LAME_TAG_SIZE] = tag
+        struct.pack_into(">H", frame, p + 34, _crc16(frame[:p + 34]))
+    return bytes(frame)
+
+def concat(sources, output=None):
+    # Joins MP3 clips at frame boundaries. ID3/APE tags and each clip's own
+    # Xing/Info frame are dropped, and one new Info frame carries the total
+    # frame count, a seek TOC, the first clip's encoder delay and the last
+    # clip's padding. Trailing frames that hold nothing but an interior
+    # clip's padding are dropped; the rest of the interior delay and
+    # padding (under a frame each, so tens of milliseconds per join) stays
+    # in the audio, since trimming it would need a re-encode.
+    # Returns the output bytes, or writes them to `output` and returns probe().
+    parts = []
+    frame_sizes = []
+    frame_bitrates = []
+    params = None
+    first_info = last_info = None
+    for i, source in enumerate(sources):
+        data = _load(source)
+        start, end = audio_bounds(data)
+        frames = iter_frames(data, start, end)
+        first = next(frames, None)
+        if first is None:
+            raise ValueError(f"No MPEG audio frames in input {i}")
+        offset, header = first
+        key = (header.version, header.layer, header.sample_rate, header.channels)
+        if params is None:
+            params = key
+            first_header_bytes = bytes(data[offset + 1:offset + 4])
+        elif key != params:
+            raise ValueError(f"Input {i} is {key}, expected {params}; re-encode it before joining")
+        vbr = read_vbr_header(data, offset, header)
+        if vbr is None:
+            frames = iter_frames(data, offset, end)
+        if i == 0:
+            first_info = vbr
+        last_info = vbr
+
+        clip = list(frames)
+        if vbr and i < len(sources) - 1:
+            # Frames wholly past the end of the audio; no later frame of this
+            # clip borrows from them, so they drop out cleanly
+            drop = min(vbr["padding"] // header.samples, len(clip) - 1)
+            if drop:
+                del clip[-drop:]
+        run_start = run_end = None
+        view = memoryview(data)
+        for pos, h in clip:
+            frame_sizes.append(h.size)
+            frame_bitrates.append(h.bitrate)
+            if pos != run_end:
+                if run_start is not None:
+                    parts.append(view[run_start:run_end])
+                run_start = pos
+            run_end = pos + h.size
+        if run_start is not None:
+            parts.append(view[run_start:run_end])
+
+    if params is None:
+        raise ValueError("Nothing to concatenate")
+    lame = first_info.get("lame") if first_info else None
+    info_frame = build_info_frame(
+        first_header_bytes, frame_sizes, frame_bitrates,
+        delay=first_info["delay"] if first_info else 0,
+        padding=last_info["padding"] if last_info else 0,
+        lame=lame
+    )
+    if output is None:
+        return info_frame + b"".join(parts)
+    tmp = output + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(info_frame)
+        for part in parts:
+            f.write(part)
+    os.replace(tmp, output)
+    return probe(output)
+
+def main():
+    parser = argparse.ArgumentParser(description="MP3 frame inspection and frame-level concatenation")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="Print stream parameters and exact duration as JSON")
+    info.add_argument("files", nargs="+")
+    info.add_argument("--scan", action="store_true", help="Count frames even when a VBR header exists")
+    join = sub.add_parser("concat", help="Join clips at frame boundaries")
+    join.add_argument("output")
+    join.add_argument("inputs", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        for path in args.files:
+            print(json.dumps({"file": path, **probe(path, scan=args.scan)}, ensure_ascii=False))
+    else:
+        result = concat(args.inputs, args.output)
+        print(f"Wrote {args.output}: {result['frames']} frames, {result['duration']:.3f}s")
+
+if __name__ == "__main__":
+    main()
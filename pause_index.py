@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+import pcm_cache
+
+# Natural pauses in an episode, found from a short-time energy envelope of
+# the decoded PCM and kept as sorted arrays, so the pause nearest to any
+# timestamp is a binary search away.
+INPUT_AUDIO = os.path.abspath("static/podcast.mp3")
+CACHE_DIR = os.path.abspath(".cache/pauses")
+EXPORT_FILE = "src/lib/pauses.json"
+HOP_SECONDS = 0.01     # Envelope resolution
+BLOCK_SECONDS = 60     # PCM analyzed per step, to bound memory
+MIN_PAUSE = 0.25       # Shorter dips are gaps between syllables, not pauses
+FLOOR_PERCENTILE = 10  # Envelope level taken as the room/noise floor
+THRESHOLD_DB = 8       # A pause sits within this many dB of the floor...
+SPEECH_DROP_DB = 20    # ...and at least this far below the median level
+
+def envelope(pcm, hop_seconds=HOP_SECONDS):
+    # Mean energy per hop in dBFS, one float32 per hop
+    hop = int(round(hop_seconds * pcm_cache.SAMPLE_RATE))
+    block = hop * int(BLOCK_SECONDS / hop_seconds)
+    out = []
+    for start in range(0, len(pcm) - hop + 1, block):
+        chunk = np.asarray(pcm[start:start + block], dtype=np.float32).mean(axis=1)
+        frames = len(chunk) // hop
+        power = np.square(chunk[:frames * hop] / 32768.0).reshape(frames, hop).mean(axis=1)
+        out.append(10 * np.log10(power + 1e-10, dtype=np.float32))
+    return np.concatenate(out) if out else np.zeros(0, dtype=np.float32)
+
+def detect(env, hop_seconds=HOP_SECONDS, min_pause=MIN_PAUSE, threshold_db=THRESHOLD_DB):
+    # (starts, ends, depths) of runs below the threshold lasting at least min_pause
+    if len(env) == 0:
+        empty = np.zeros(0)
+        return empty, empty, empty
+    # The floor alone fails when pauses are under FLOOR_PERCENTILE of the episode
+    floor, median = np.percentile(env, [FLOOR_PERCENTILE, 50])
+    threshold = min(floor + threshold_db, median - SPEECH_DROP_DB)
+    quiet = np.concatenate(([False], env < threshold, [False]))
+    edges = np.flatnonzero(np.diff(quiet.astype(np.int8)))
+    run_starts, run_ends = edges[0::2], edges[1::2]
+    keep = (run_ends - run_starts) * hop_seconds >= min_pause
+    run_starts, run_ends = run_starts[keep], run_ends[keep]
+    # Mean level of each pause through a prefix sum over the envelope
+    csum = np.concatenate(([0.0], np.cumsum(env, dtype=np.float64)))
+    depths = (csum[run_ends] - csum[run_starts]) / (run_ends - run_starts)
+    return run_starts * hop_seconds, run_ends * hop_seconds, depths
+
+class PauseIndex:
+    def __init__(self, starts, ends, depths):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+        self.depths = np.asarray(depths, dtype=np.float64)
+        self.centers = (self.starts + self.ends) / 2
+        self._filtered = {}
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def build(cls, path=INPUT_AUDIO, min_pause=MIN_PAUSE, threshold_db=THRESHOLD_DB):
+        return cls(*detect(envelope(pcm_cache.load(path)), min_pause=min_pause, threshold_db=threshold_db))
+
+    @classmethod
+    def load(cls, path=INPUT_AUDIO, min_pause=MIN_PAUSE, threshold_db=THRESHOLD_DB, cache_dir=CACHE_DIR):
+        # Cached per decoded episode and detection settings
+        # Keyed like the PCM cache, without decoding when only the PCM was evicted
+        key = os.path.splitext(os.path.basename(pcm_cache.cache_path(path)))[0]
+        cache_file = os.path.join(cache_dir, f"{key}_{min_pause}_{threshold_db}.npz")
+        if os.path.exists(cache_file):
+            with np.load(cache_file) as data:
+                return cls(data["starts"], data["ends"], data["depths"])
+        index = cls.build(path, min_pause, threshold_db)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = cache_file + ".tmp.npz"
+        np.savez(tmp, starts=index.starts, ends=index.ends, depths=index.depths)
+        os.replace(tmp, cache_file)
+        return index
+
+    def pause(self, i):
+        return {
+            "start": float(self.starts[i]),
+            "end": float(self.ends[i]),
+            "center": float(self.centers[i]),
+            "duration": float(self.ends[i] - self.starts[i]),
+            "depth_db": float(self.depths[i])
+        }
+
+    def _long_enough(self, min_duration):
+        # (positions, centers, starts) of the pauses at least min_duration
+        # long, filtered once per distinct value so lookups stay binary searches
+        if not min_duration:
+            return None, self.centers, self.starts
+        entry = self._filtered.get(min_duration)
+        if entry is None:
+            positions = np.flatnonzero(self.ends - self.starts >= min_duration)
+            entry = (positions, self.centers[positions], self.starts[positions])
+            self._filtered[min_duration] = entry
+        return entry
+
+    def nearest(self, t, min_duration=0.0):
+        # Position of the pause whose center is closest to t, or None
+        positions, centers, _ = self._long_enough(min_duration)
+        i = int(np.searchsorted(centers, t))
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(centers)]
+        if not candidates:
+            return None
+        j = min(candidates, key=lambda j: abs(centers[j] - t))
+        return j if positions is None else int(positions[j])
+
+    def next_after(self, t, min_duration=0.0):
+        # Position of the first pause starting at or after t, or None
+        positions, _, starts = self._long_enough(min_duration)
+        i = int(np.searchsorted(starts, t))
+        if i >= len(starts):
+            return None
+        return i if positions is None else int(positions[i])
+
+    def snap(self, t, max_shift=None, min_duration=0.0):
+        # t moved to the center of the nearest pause, unless that is further
+        # than max_shift seconds away
+        i = self.nearest(t, min_duration)
+        if i is None or (max_shift is not None and abs(self.centers[i] - t) > max_shift):
+            return t
+        return float(self.centers[i])
+
+    def export(self, output_file=EXPORT_FILE):
+        # Compact JSON (centisecond integers) for the web routes
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "starts": np.round(self.starts * 100).astype(int).tolist(),
+                "ends": np.round(self.ends * 100).astype(int).tolist(),
+                "unit": 0.01
+            }, f, separators=(",", ":"))
+        return output_file
+
+def main():
+    parser = argparse.ArgumentParser(description="Pause/silence index for snapping insertion points")
+    parser.add_argument("--input", default=INPUT_AUDIO)
+    parser.add_argument("--min-pause", type=float, default=MIN_PAUSE, help="Shortest pause in seconds")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD_DB, help="dB above the noise floor")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Analyze the episode and cache its pauses")
+    build.add_argument("--export", nargs="?", const=EXPORT_FILE, default=None,
+                       help=f"Also write the pauses as JSON (default path: {EXPORT_FILE})")
+    near = sub.add_parser("nearest", help="Print the pause nearest to each timestamp")
+    near.add_argument("seconds", type=float, nargs="+")
+    near.add_argument("--min-duration", type=float, default=0.0)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    index = PauseIndex.load(args.input, args.min_pause, args.threshold)
+    print(f"{len(index)} pauses ({time.perf_counter() - t0:.3f}s)")
+    if args.command == "build":
+        if args.export:
+            print(f"Exported to {index.export(args.export)}")
+    else:
+        for t in args.seconds:
+            i = index.nearest(t, args.min_duration)
+            print(json.dumps({"query": t, "pause": index.pause(i) if i is not None else None}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import os
+import subprocess
+import numpy as np
+
+import metrics
+from build_cache import BuildManifest
+
+# Decoded episodes live here as raw PCM, named by the source's content hash
+CACHE_DIR = os.path.abspath(".cache/pcm")
+MAX_CACHE_BYTES = 8 * 1024 ** 3 # Evict least recently used episodes beyond 8 GB
+SAMPLE_RATE = 44100
+CHANNELS = 1
+DTYPE = np.int16 # s16le
+FFMPEG_FORMAT = "s16le"
+
+def cache_path(path, manifest=None):
+    # The source is hashed through the build manifest, which reuses the
+    # stored hash while its size and mtime are unchanged
+    own = manifest is None
+    manifest = manifest or BuildManifest()
+    before = manifest.data["files"].get(os.path.abspath(path))
+    digest = manifest.hash_file(path)
+    if own and manifest.data["files"][os.path.abspath(path)] != before:
+        manifest.save()
+    key = f"{digest}_{SAMPLE_RATE}_{CHANNELS}"
+    return os.path.join(CACHE_DIR, f"{key}.pcm")
+
+def decode(path):
+    # Returns the cached PCM file for `path`, decoding it on a miss
+    pcm_file = cache_path(path)
+    if os.path.exists(pcm_file):
+        os.utime(pcm_file) # mtime doubles as the LRU timestamp
+        return pcm_file
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_file = pcm_file + ".part"
+    cmd = [
+        "ffmpeg", "-y", "-i", path,
+        "-f", FFMPEG_FORMAT, "-ac", str(CHANNELS), "-ar", str(SAMPLE_RATE),
+        tmp_file
+    ]
+    with metrics.span("ffmpeg_decode") as span:
+        result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if os.path.exists(tmp_file):
+            span.add_bytes(os.path.getsize(tmp_file))
+    if result.returncode != 0:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise RuntimeError(f"ffmpeg failed to decode {path}: {result.stderr.decode('utf-8', 'replace')[-500:]}")
+
+    os.replace(tmp_file, pcm_file)
+    evict(keep=pcm_file)
+    return pcm_file
+
+def evict(max_bytes=MAX_CACHE_BYTES, keep=None):
+    if not os.path.isdir(CACHE_DIR):
+        return []
+
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if not name.endswith(".pcm"):
+            continue
+        full = os.path.join(CACHE_DIR, name)
+        st = os.stat(full)
+        entries.append((st.st_mtime, st.st_size, full))
+
+    total = sum(size for _, size, _ in entries)
+    removed = []
+    for _, size, full in sorted(entries):
+        if total <= max_bytes:
+            break
+        if full == keep:
+            continue
+        os.remove(full)
+        total -= size
+        removed.append(full)
+
+    return removed
+
+def load(path):
+    # Read-only memory map of the decoded episode, shape (frames, channels)
+    pcm_file = decode(path)
+    samples = np.memmap(pcm_file, dtype=DTYPE, mode='r')
+    return samples.reshape(-1, CHANNELS)
+
+def to_frame(seconds):
+    return int(round(seconds * SAMPLE_RATE))
+
+def slice_seconds(pcm, start, duration):
+    # A view into the memory map; nothing is copied
+    return pcm[to_frame(start):to_frame(start + duration)]
+
+def duration(pcm):
+    return len(pcm) / SAMPLE_RATE
+
+def rms(pcm):
+    if len(pcm) == 0:
+        return 0.0
+    return float(np.sqrt(np.mean(np.square(pcm, dtype=np.float64))))
+
+def encoder_cmd(output, codec_args=("-q:a", "2")):
+    return [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", FFMPEG_FORMAT, "-ac", str(CHANNELS), "-ar", str(SAMPLE_RATE),
+        "-i", "pipe:0",
+        *codec_args,
+        output
+    ]
+
+def write_clip(views, output_path):
+    # Streams the views into one encoder in order, concatenating without copies
+    proc = subprocess.Popen(encoder_cmd(output_path), stdin=subprocess.PIPE,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        for view in views:
+            proc.stdin.write(memoryview(np.ascontiguousarray(view)).cast('B'))
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass # ffmpeg stopped reading; its stderr says why
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    stderr = proc.stderr.read()
+    if proc.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed to encode {output_path}: {stderr.decode('utf-8', 'replace')[-500:]}")
+    return output_path
@@ -35,7 +35,7 @@ export async function selectInsertPoint(req: AiInteractionRequest): Promise<Inse
     }
 }
 
-export async function generateAIContent(userQuery: string, contextBefore?: string, contextAfter?: string): Promise<AiInteractionResponse> {
+export async function generateAIContent(userQuery: string, contextBefore?: string, contextAfter?: string, segmentIndex?: number): Promise<AiInteractionResponse> {
     console.log("[API] Generating AI content...");
     const startTime = Date.now();
     
@@ -48,7 +48,8 @@ export async function generateAIContent(userQuery: string, contextBefore?: strin
             body: JSON.stringify({
                 userQuery,
                 contextBefore,
-                contextAfter
+                contextAfter,
+                segmentIndex
             })
         });
 
@@ -1,18 +1,29 @@
 import { json } from '@sveltejs/kit';
 import { MINIMAX_API_KEY, DOUBAO_API_KEY, DOUBAO_BASE_URL } from '$env/static/private';
+import { env } from '$env/dynamic/private';
 import { Buffer } from 'buffer';
 import mp3Duration from 'mp3-duration';
 import { promisify } from 'util';
 import { readFileSync, appendFileSync } from 'fs';
 import { join } from 'path';
+import contextWindowsData from '$lib/context_windows.json';
 
 import type { RequestHandler } from './$types';
 
 // Promisify mp3Duration
 const getDuration = promisify(mp3Duration);
 
-// MiniMax T2A V2 API URL
-const T2A_V2_URL = "https://api.minimaxi.com/v1/t2a_v2";
+// MiniMax T2A V2 API URL (MINIMAX_BASE_URL can point at the local mock server)
+const MINIMAX_BASE_URL = env.MINIMAX_BASE_URL || "https://api.minimaxi.com";
+const T2A_V2_URL = `${MINIMAX_BASE_URL}/v1/t2a_v2`;
+// Optional local synthesis_service.py that renders all lines concurrently
+const SYNTHESIS_SERVICE_URL = env.SYNTHESIS_SERVICE_URL;
+
+type GeneratedSegment = {
+    audioUrl: string;
+    duration: number;
+    transcript: { speaker: string; content: string; timestamp: string; type: 'generated' };
+};
 
 // Voice IDs
 const LUO_VOICE_ID = "luo_yonghao_clone_v1";
@@ -24,6 +35,8 @@ const SPEAKER_INFO = readFileSync(join(process.cwd(), '对话人信息.txt'), 'u
 const DIALOGUE_HABITS = readFileSync(join(process.cwd(), '对话习惯.txt'), 'utf-8');
 
 const LOG_FILE = join(process.cwd(), 'api-debug.log');
+// One JSON line per answered query, replayed by cache_warmer.py
+const REQUEST_LOG_FILE = join(process.cwd(), 'requests.jsonl');
 
 function writeLog(content: string) {
     const timestamp = new Date().toISOString();
@@ -35,8 +48,26 @@ function writeLog(content: string) {
     }
 }
 
+function recordRequest(entry: Record<string, unknown>) {
+    try {
+        appendFileSync(REQUEST_LOG_FILE, JSON.stringify({ at: new Date().toISOString(), ...entry }) + '\n', 'utf-8');
+    } catch (e) {
+        console.error('Failed to write request log:', e);
+    }
+}
+
+// [before, after] context for an insertion right after each original
+// transcript segment, precomputed by convert_transcript.py
+const contextWindows = contextWindowsData as [string, string][];
+
 export const POST: RequestHandler = async ({ request }) => {
-    const { userQuery, contextBefore, contextAfter } = await request.json();
+    const body = await request.json();
+    const { userQuery, segmentIndex } = body;
+    let { contextBefore, contextAfter } = body;
+    if (contextBefore === undefined && contextAfter === undefined
+        && Number.isInteger(segmentIndex) && contextWindows[segmentIndex]) {
+        [contextBefore, contextAfter] = contextWindows[segmentIndex];
+    }
     
     if (!userQuery) {
         return json({ error: "No query provided" }, { status: 400 });
@@ -282,32 +313,37 @@ ${JSON.stringify(initialDialogue, null, 2)}
             }
         }
 
+        log(`Final dialogue: ${JSON.stringify(initialDialogue)}`);
+        recordRequest({ userQuery, contextBefore, contextAfter, dialogue: initialDialogue });
+
         // Generate audio for each speaker
         log("Generating audio for polished dialogue...");
-        const segments = [];
+        const segments: GeneratedSegment[] = SYNTHESIS_SERVICE_URL ? await synthesizeViaService(initialDialogue, log) : [];
         
-        for (const line of initialDialogue) {
-            const voiceId = line.speaker.includes('罗永浩') ? LUO_VOICE_ID : TIM_VOICE_ID;
-            const audio = await generateT2A(voiceId, line.content, log);
+        if (segments.length === 0) {
+            for (const line of initialDialogue) {
+                const voiceId = line.speaker.includes('罗永浩') ? LUO_VOICE_ID : TIM_VOICE_ID;
+                const audio = await generateT2A(voiceId, line.content, log);
             
-            if (!audio) {
-                log(`Warning: Failed to generate audio for ${line.speaker}`);
-                continue;
-            }
+                if (!audio) {
+                    log(`Warning: Failed to generate audio for ${line.speaker}`);
+                    continue;
+                }
             
-            const duration = await getDuration(audio);
-            log(`Generated audio for ${line.speaker}: ${duration.toFixed(2)}s`);
+                const duration = await getDuration(audio);
+                log(`Generated audio for ${line.speaker}: ${duration.toFixed(2)}s`);
             
-            segments.push({
-                audioUrl: `data:audio/mp3;base64,${audio.toString('base64')}`,
-                duration,
-                transcript: {
-                    speaker: line.speaker.includes('罗永浩') ? "罗永浩 (AI)" : "Tim (AI)",
-                    content: line.content,
-                    timestamp: "AI-Gen",
-                    type: 'generated'
-                }
-            });
+                segments.push({
+                    audioUrl: `data:audio/mp3;base64,${audio.toString('base64')}`,
+                    duration,
+                    transcript: {
+                        speaker: line.speaker.includes('罗永浩') ? "罗永浩 (AI)" : "Tim (AI)",
+                        content: line.content,
+                        timestamp: "AI-Gen",
+                        type: 'generated'
+                    }
+                });
+            }
         }
 
         if (segments.length === 0) {
@@ -328,6 +364,43 @@ ${JSON.stringify(initialDialogue, null, 2)}
     }
 };
 
+async function synthesizeViaService(dialogue: Array<{ speaker: string; content: string }>, log: Function): Promise<GeneratedSegment[]> {
+    try {
+        const resp = await fetch(`${SYNTHESIS_SERVICE_URL}/synthesize`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ dialogue })
+        });
+        const data = await resp.json();
+        if (!resp.ok) {
+            log(`Synthesis service error: ${JSON.stringify(data)}`);
+            return [];
+        }
+        log(`Synthesis service rendered ${data.segments.length} lines in ${data.seconds}s`);
+        const segments: GeneratedSegment[] = [];
+        for (const seg of data.segments) {
+            if (seg.error) {
+                log(`Warning: Failed to generate audio for ${seg.speaker}: ${seg.error}`);
+                continue;
+            }
+            segments.push({
+                audioUrl: `data:audio/mp3;base64,${seg.audio}`,
+                duration: seg.duration,
+                transcript: {
+                    speaker: seg.speaker.includes('罗永浩') ? "罗永浩 (AI)" : "Tim (AI)",
+                    content: seg.content,
+                    timestamp: "AI-Gen",
+                    type: 'generated'
+                }
+            });
+        }
+        return segments;
+    } catch (e: any) {
+        log(`Synthesis service unreachable, falling back to serial T2A: ${e.message}`);
+        return [];
+    }
+}
+
 async function generateT2A(voiceId: string, text: string, log: Function): Promise<Buffer | null> {
     try {
         const resp = await fetch(T2A_V2_URL, {
@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import base64
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import metrics
+from minimax_client import DEFAULT_CONCURRENCY, ROUTE_SETTINGS, MiniMaxClient, voice_for
+from mp3_frames import duration as mp3_duration
+from tts_cache import TTSCache
+
+# Local asyncio service that renders a whole dialogue at once. Lines are
+# synthesized concurrently under one fan-out limit shared by all requests,
+# durations come from the MP3 headers, and results are returned in
+# dialogue order or streamed as NDJSON as each line finishes.
+#
+#   POST /synthesize  {"dialogue": [{"speaker": ..., "content": ...}], "stream": false}
+#
+# The interact route delegates here when SYNTHESIS_SERVICE_URL is set.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8790
+MAX_BODY = 1 << 20
+
+def valid_line(line):
+    # The text to speak is required; speaker and voice_id may be left out
+    return (isinstance(line, dict) and isinstance(line.get("content"), str)
+            and all(isinstance(line.get(k) or "", str) for k in ("speaker", "voice_id")))
+
+class DialogueSynthesizer:
+    def __init__(self, client, concurrency=DEFAULT_CONCURRENCY):
+        self.client = client
+        self.concurrency = concurrency
+        self._semaphore = None
+
+    async def _line(self, i, line):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        speaker = line.get("speaker") or ""
+        settings = {"voice_id": line.get("voice_id") or voice_for(speaker), **ROUTE_SETTINGS}
+        result = {"index": i, "speaker": speaker, "content": line.get("content", ""), "voice_id": settings["voice_id"]}
+        start = time.perf_counter()
+        try:
+            async with self._semaphore:
+                audio = await asyncio.to_thread(self.client.t2a, result["content"], **settings)
+            result["duration"] = mp3_duration(audio)
+            result["audio"] = base64.b64encode(audio).decode("ascii")
+        except Exception as e:
+            result["error"] = str(e)[:300]
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        return result
+
+    def _tasks(self, dialogue):
+        return [asyncio.ensure_future(self._line(i, line)) for i, line in enumerate(dialogue) if line.get("content")]
+
+    async def synthesize(self, dialogue):
+        # Every line's result, in dialogue order
+        with metrics.span("dialogue", lines=len(dialogue)):
+            return list(await asyncio.gather(*self._tasks(dialogue)))
+
+    async def stream(self, dialogue):
+        # Results as they finish; each carries its dialogue index
+        tasks = self._tasks(dialogue)
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+class SynthesisServer:
+    # Minimal HTTP/1.1 on asyncio streams, enough for a local JSON service
+    def __init__(self, synthesizer):
+        self.synthesizer = synthesizer
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            if length > MAX_BODY:
+                return await self._json(writer, 413, {"error": "request too large"})
+            body = await reader.readexactly(length) if length else b""
+
+            path = urlparse(target).path
+            if method == "GET" and path == "/health":
+                return await self._json(writer, 200, {"ok": True, "concurrency": self.synthesizer.concurrency})
+            if method != "POST" or path != "/synthesize":
+                return await self._json(writer, 404, {"error": f"not found: {method} {path}"})
+            try:
+                payload = json.loads(body or b"{}")
+                dialogue = payload["dialogue"]
+            except (ValueError, KeyError, TypeError):
+                return await self._json(writer, 400, {"error": "expected {\"dialogue\": [...]}"})
+            if not isinstance(dialogue, list) or not all(valid_line(line) for line in dialogue):
+                return await self._json(writer, 400, {"error": "dialogue entries must be objects with string "
+                                                               "content (the text to speak); speaker and "
+                                                               "voice_id are optional strings"})
+
+            if payload.get("stream"):
+                await self._stream(writer, dialogue)
+            else:
+                start = time.perf_counter()
+                results = await self.synthesizer.synthesize(dialogue)
+                await self._json(writer, 200, {"segments": results, "seconds": round(time.perf_counter() - start, 3)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _json(self, writer, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                     f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
+
+    async def _stream(self, writer, dialogue):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n")
+        async for result in self.synthesizer.stream(dialogue):
+            line = json.dumps(result, ensure_ascii=False).encode("utf-8") + b"\n"
+            writer.write(b"%x\r\n%s\r\n" % (len(line), line))
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, client=None, concurrency=DEFAULT_CONCURRENCY):
+    client = client or MiniMaxClient(cache=TTSCache(), pool_size=max(concurrency, 1))
+    # t2a calls block, so give them as many threads as the fan-out allows
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    server = SynthesisServer(DialogueSynthesizer(client, concurrency))
+    return await asyncio.start_server(server.handle, host, port)
+
+async def _main(args):
+    server = await serve(args.host, args.port, concurrency=args.concurrency)
+    print(f"Synthesis service on http://{args.host}:{server.sockets[0].getsockname()[1]} "
+          f"(up to {args.concurrency} lines at once)")
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local service that synthesizes whole dialogues concurrently")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="t2a requests in flight")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    with metrics.run("synthesis_service"):
+        main()
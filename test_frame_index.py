@@ -0,0 +1,66 @@
+import pytest
+
+import mp3_frames
+from frame_index import FrameIndex
+
+def heavy_reservoir_stream(path, bitrate_index, frames=1200):
+    # Mono MPEG-1 Layer III at 44.1 kHz behind a LAME-tagged Info frame,
+    # every frame after the first with main_data_begin 511 and main data
+    # bytes numbered so a wrong reservoir shows up as a byte mismatch
+    header = bytes([0xFB, bitrate_index << 4, 0xC0])
+    h = mp3_frames.parse_header(b"\xff" + header, 0)
+    body = bytearray()
+    for i in range(frames):
+        frame = bytearray(h.size)
+        frame[:4] = b"\xff" + header
+        if i:
+            frame[4:6] = b"\xff\x80"
+        area = 4 + h.side_info
+        frame[area:] = i.to_bytes(2, "big") + bytes((i * 7 + k) & 0xFF for k in range(h.size - area - 2))
+        body += frame
+    lame = b"LAME3.100" + bytes(mp3_frames.LAME_TAG_SIZE - 9)
+    info = mp3_frames.build_info_frame(header, [h.size] * frames, [h.bitrate] * frames,
+                                       delay=576, padding=0, lame=lame)
+    with open(path, "wb") as f:
+        f.write(info + body)
+
+def main_data(frames):
+    # (frame, main_data_begin, reservoir bytes seen by the decoder) for
+    # each audio frame, skipping the Info frame
+    stream = b""
+    for i, frame in enumerate(frames):
+        h = mp3_frames.parse_header(frame, 0)
+        begin = mp3_frames.main_data_begin(frame, 0, h)
+        if i:
+            yield frame, begin, stream[len(stream) - begin:] if begin <= len(stream) else None
+        stream += frame[mp3_frames.main_data_start(frame, 0, h):]
+
+def split_frames(data):
+    start, end = mp3_frames.audio_bounds(data)
+    return [bytes(data[pos:pos + h.size]) for pos, h in mp3_frames.iter_frames(data, start, end)]
+
+@pytest.mark.parametrize("bitrate_index", [9, 4, 1]) # 128, 56 and 32 kbps
+@pytest.mark.parametrize("start", [1.0, 9.7, 20.3])
+def test_cut_keeps_delay_in_range_with_a_heavy_reservoir(tmp_path, bitrate_index, start):
+    path = str(tmp_path / "source.mp3")
+    heavy_reservoir_stream(path, bitrate_index)
+    index = FrameIndex.build(path)
+    clip = index.cut([{"start": start, "duration": 2.0}])
+
+    info = mp3_frames.probe(clip)
+    assert 0 <= info["delay"] <= mp3_frames.MAX_TRIM
+    assert info["duration"] == pytest.approx(2.0, abs=1 / 44100)
+
+    # Every frame whose output is kept decodes from the source's reservoir
+    with open(path, "rb") as f:
+        source = {frame[4:]: reservoir for frame, _, reservoir in main_data(split_frames(f.read()))}
+    frames = split_frames(clip)
+    skip = info["delay"] // index.samples_per_frame - 1
+    for n, (frame, begin, reservoir) in enumerate(main_data(frames)):
+        if n >= skip and begin:
+            assert reservoir == source[frame[4:]]
+
+def test_info_frame_rejects_out_of_range_delay():
+    lame = b"LAME3.100" + bytes(mp3_frames.LAME_TAG_SIZE - 9)
+    with pytest.raises(ValueError, match="0..4095"):
+        mp3_frames.build_info_frame(bytes([0xFB, 0x90, 0xC0]), [417], [128000], delay=4096, lame=lame)
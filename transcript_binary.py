@@ -0,0 +1,167 @@
+import mmap
+import struct
+import sys
+from array import array
+
+# Columnar transcript file (little-endian):
+#   header   magic, version, speaker count, segment count, blob size
+#   speakers u16 length + UTF-8 name, per speaker
+#   seconds  uint32[n]   segment start times
+#   speaker  uint8[n]    index into the speaker table
+#   offsets  uint32[n+1] content start/end positions in the blob
+#   blob     UTF-8 content of every segment, back to back
+# Each column starts on a 4-byte boundary so it can be cast in place.
+MAGIC = b"PTRB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQ")
+BINARY_OUTPUT_FILE = 'src/lib/transcript.bin'
+
+def format_timestamp(seconds):
+    # Matches the transcript's own MM:SS / HH:MM:SS style
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h:02d}:{m:02d}:{s:02d}" if h else f"{m:02d}:{s:02d}"
+
+def _pad(n):
+    return -n % 4
+
+def _le(arr):
+    if sys.byteorder != 'little':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+def write_binary(records, output_file):
+    speakers = []
+    speaker_ids = {}
+    seconds = array('I')
+    speaker_col = array('B')
+    offsets = array('I', [0])
+    blob = bytearray()
+
+    for record in records:
+        sid = speaker_ids.get(record['speaker'])
+        if sid is None:
+            sid = speaker_ids[record['speaker']] = len(speakers)
+            speakers.append(record['speaker'])
+            if sid > 0xFF:
+                raise ValueError("more than 256 speakers do not fit the uint8 speaker column")
+        seconds.append(record['seconds'])
+        speaker_col.append(sid)
+        blob += record['content'].encode('utf-8')
+        offsets.append(len(blob))
+
+    table = b"".join(struct.pack("<H", len(name.encode('utf-8'))) + name.encode('utf-8') for name in speakers)
+    n = len(seconds)
+
+    with open(output_file, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(speakers), n, len(blob)))
+        f.write(table + b"\0" * _pad(HEADER.size + len(table)))
+        f.write(_le(seconds))
+        f.write(speaker_col.tobytes() + b"\0" * _pad(n))
+        f.write(_le(offsets))
+        f.write(blob)
+
+    return n
+
+class _Contents:
+    # Sequence view that decodes a segment's text only when it is accessed
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return str(self._blob[self._offsets[i]:self._offsets[i + 1]], 'utf-8')
+
+class _Timestamps:
+    def __init__(self, seconds):
+        self._seconds = seconds
+
+    def __len__(self):
+        return len(self._seconds)
+
+    def __getitem__(self, i):
+        return format_timestamp(self._seconds[i])
+
+class BinaryTranscript:
+    # Memory-maps a transcript written by write_binary. The columns are
+    # zero-copy views of the map; content is decoded per segment on access.
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = self._view = memoryview(self._mmap)
+
+        magic, version, speaker_count, n, blob_size = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} binary transcript")
+
+        pos = HEADER.size
+        self.speakers = []
+        for _ in range(speaker_count):
+            (length,) = struct.unpack_from("<H", view, pos)
+            self.speakers.append(str(view[pos + 2:pos + 2 + length], 'utf-8'))
+            pos += 2 + length
+        pos += _pad(pos)
+
+        self.seconds = self._column(view, pos, 'I', n)
+        pos += 4 * n
+        self.speaker_ids = view[pos:pos + n]
+        pos += n + _pad(n)
+        self._offsets = self._column(view, pos, 'I', n + 1)
+        pos += 4 * (n + 1)
+
+        self.contents = _Contents(view[pos:pos + blob_size], self._offsets)
+        self.timestamps = _Timestamps(self.seconds)
+
+    @staticmethod
+    def _column(view, pos, typecode, count):
+        col = view[pos:pos + 4 * count].cast(typecode)
+        if sys.byteorder != 'little':
+            col = array(typecode, col)
+            col.byteswap()
+        return col
+
+    def __len__(self):
+        return len(self.seconds)
+
+    def speaker(self, i):
+        return self.speakers[self.speaker_ids[i]]
+
+    def record(self, i):
+        return {
+            'speaker': self.speaker(i),
+            'timestamp': self.timestamps[i],
+            'seconds': self.seconds[i],
+            'content': self.contents[i]
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def close(self):
+        # Views must be released before the map can be closed
+        for name in ('seconds', 'speaker_ids', '_offsets'):
+            col = self.__dict__.pop(name, None)
+            if isinstance(col, memoryview):
+                col.release()
+        contents = self.__dict__.pop('contents', None)
+        if contents is not None:
+            contents._blob.release()
+        self.__dict__.pop('timestamps', None)
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,153 @@
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+TRANSCRIPT_FILE = "src/lib/transcript.bin"
+LAST_SEGMENT_DURATION = 5 # Estimate for the last segment, which has no successor
+
+class TranscriptIndex:
+    # Columnar view of a transcript: interned speaker IDs, start/end arrays
+    # and per-speaker prefix sums, so time and duration queries are bisections.
+
+    def __init__(self, records):
+        self.speakers = []
+        self._speaker_ids = {}
+        self.speaker_ids = array('H')
+        self.starts = array('d')
+        self.ends = array('d')
+        self.timestamps = []
+        self.contents = []
+
+        for i, rec in enumerate(records):
+            start = rec['seconds']
+            if i < len(records) - 1:
+                end = records[i + 1]['seconds']
+            else:
+                end = start + LAST_SEGMENT_DURATION
+            self.speaker_ids.append(self._intern(rec['speaker']))
+            self.starts.append(start)
+            self.ends.append(max(start, end))
+            self.timestamps.append(rec.get('timestamp', ''))
+            self.contents.append(rec['content'])
+
+        self._groups = {}
+
+    @classmethod
+    def load(cls, path=TRANSCRIPT_FILE):
+        if path.endswith(".bin"):
+            return cls.from_binary(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def from_binary(cls, path):
+        # Builds the index from the columnar file without materialising any
+        # records; content and timestamps stay lazy views over the mmap
+        from transcript_binary import BinaryTranscript
+
+        binary = BinaryTranscript(path)
+        index = cls([])
+        index._binary = binary
+        for name in binary.speakers:
+            index._intern(name)
+        index.speaker_ids = array('H', binary.speaker_ids)
+        index.starts = array('d', binary.seconds)
+        index.ends = array('d', index.starts[1:])
+        if len(index.starts):
+            index.ends.append(index.starts[-1] + LAST_SEGMENT_DURATION)
+        for i in range(len(index.ends)):
+            index.ends[i] = max(index.starts[i], index.ends[i])
+        index.timestamps = binary.timestamps
+        index.contents = binary.contents
+        return index
+
+    def _intern(self, speaker):
+        sid = self._speaker_ids.get(speaker)
+        if sid is None:
+            sid = len(self.speakers)
+            self._speaker_ids[speaker] = sid
+            self.speakers.append(speaker)
+        return sid
+
+    def __len__(self):
+        return len(self.starts)
+
+    def duration(self, i):
+        return self.ends[i] - self.starts[i]
+
+    def speaker(self, i):
+        return self.speakers[self.speaker_ids[i]]
+
+    def segment(self, i):
+        return {
+            "index": i,
+            "speaker": self.speaker(i),
+            "timestamp": self.timestamps[i],
+            "start": self.starts[i],
+            "duration": self.duration(i),
+            "content": self.contents[i]
+        }
+
+    def segments(self, indices=None):
+        # Segments with a positive duration, in transcript order
+        if indices is None:
+            indices = (i for i in range(len(self)) if self.duration(i) > 0)
+        return [self.segment(i) for i in indices]
+
+    def resolve_speakers(self, name):
+        # Exact match first, then the substring match the scripts have always used
+        if name in self._speaker_ids:
+            return (self._speaker_ids[name],)
+        return tuple(sid for sid, speaker in enumerate(self.speakers) if name in speaker)
+
+    def _group(self, name):
+        # (segment positions, prefix sums of duration) for a speaker name
+        ids = self.resolve_speakers(name)
+        group = self._groups.get(ids)
+        if group is None:
+            wanted = set(ids)
+            positions = array('l', (i for i in range(len(self))
+                                    if self.speaker_ids[i] in wanted and self.duration(i) > 0))
+            prefix = array('d', accumulate((self.duration(i) for i in positions), initial=0.0))
+            group = self._groups[ids] = (positions, prefix)
+        return group
+
+    def speaker_segments(self, name):
+        return list(self._group(name)[0])
+
+    def speaker_duration(self, name):
+        return self._group(name)[1][-1]
+
+    def first_seconds(self, name, seconds):
+        # Leading segments of a speaker, stopping at the first one that takes
+        # the running total to `seconds` (or all of them if it never does)
+        positions, prefix = self._group(name)
+        count = min(bisect_left(prefix, seconds), len(positions))
+        return list(positions[:count]), prefix[count]
+
+    def cumulative_duration(self, name, t):
+        # How many seconds the speaker has spoken before time t
+        positions, prefix = self._group(name)
+        k = bisect_right(self.starts, t) - 1
+        if k < 0:
+            return 0.0
+        n = bisect_right(positions, k)
+        total = prefix[n]
+        if n and positions[n - 1] == k:
+            total -= max(0.0, self.ends[k] - t)
+        return total
+
+    def segment_at(self, t):
+        # Index of the segment playing at time t, or None outside the transcript
+        i = bisect_right(self.starts, t) - 1
+        if i < 0 or t >= self.ends[i]:
+            return None
+        return i
+
+    def window(self, t, before=10, after=10):
+        # Segment indices around the one playing at t
+        i = bisect_right(self.starts, t) - 1
+        if i < 0:
+            i = 0
+        return range(max(0, i - before), min(len(self), i + after + 1))
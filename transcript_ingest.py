@@ -0,0 +1,110 @@
+import codecs
+import json
+import os
+import re
+import sys
+
+from transcript_binary import BINARY_OUTPUT_FILE, write_binary
+
+INPUT_FILE = '罗永浩 x 影视飓风Tim_原文.txt'
+OUTPUT_FILE = 'src/lib/transcript.json'
+SAMPLE_SIZE = 64 * 1024 # Bytes inspected to pick the encoding
+
+# Regex to identify speaker lines: Name followed by Timestamp
+# Examples: "Tim   00:11" (MM:SS) or "罗永浩   01:00:07" (HH:MM:SS)
+# Allowing for some flexibility in whitespace
+SPEAKER_PATTERN = re.compile(r'^(.+?)\s+(\d{1,2}:\d{2}(?::\d{2})?)$')
+
+def detect_encoding(path, sample_size=SAMPLE_SIZE):
+    with open(path, 'rb') as f:
+        sample = f.read(sample_size)
+
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    try:
+        # final=False tolerates a multi-byte character cut off by the sample
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return 'gb18030'
+
+def time_to_seconds(time_str):
+    parts = list(map(int, time_str.split(':')))
+    if len(parts) == 2:
+        return parts[0] * 60 + parts[1]
+    elif len(parts) == 3:
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    return 0
+
+def iter_lines(path, encoding=None):
+    with open(path, 'r', encoding=encoding or detect_encoding(path)) as f:
+        for line in f:
+            yield line
+
+def iter_dialogues(lines):
+    # Yields (speaker, timestamp, content) as soon as the next speaker line
+    # closes an entry, so only one entry is ever held in memory
+    current_speaker = None
+    current_timestamp = None
+    current_content = []
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        match = SPEAKER_PATTERN.match(line)
+        if match:
+            if current_speaker and current_content:
+                yield current_speaker, current_timestamp, " ".join(current_content)
+                current_content = []
+
+            current_speaker = match.group(1).strip()
+            current_timestamp = match.group(2).strip()
+        elif current_speaker:
+            # Lines before the first speaker line are the title/date header
+            current_content.append(line)
+
+    # Add the last entry
+    if current_speaker and current_content:
+        yield current_speaker, current_timestamp, " ".join(current_content)
+
+def to_record(speaker, timestamp, content):
+    return {
+        'speaker': speaker,
+        'timestamp': timestamp,
+        'seconds': time_to_seconds(timestamp),
+        'content': content
+    }
+
+def iter_records(path, encoding=None):
+    for speaker, timestamp, content in iter_dialogues(iter_lines(path, encoding)):
+        yield to_record(speaker, timestamp, content)
+
+def write_json(records, output_file):
+    # Same bytes as json.dump(list(records), indent=2, ensure_ascii=False),
+    # written one record at a time
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    tmp_file = output_file + '.tmp'
+    count = 0
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        for record in records:
+            body = json.dumps(record, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+            f.write(('[\n  ' if count == 0 else ',\n  ') + body)
+            count += 1
+        f.write('\n]' if count else '[]')
+    os.replace(tmp_file, output_file)
+    return count
+
+def ingest(input_file=INPUT_FILE, output_file=OUTPUT_FILE, binary_output_file=BINARY_OUTPUT_FILE):
+    # The binary copy is what the Python tools load, so it is rewritten
+    # alongside the JSON the web app imports
+    encoding = detect_encoding(input_file)
+    records = list(iter_records(input_file, encoding))
+    count = write_json(records, output_file)
+    write_binary(records, binary_output_file)
+    print(f"Successfully ingested {count} dialogue entries ({encoding}) into {output_file} and {binary_output_file}")
+    return count
+
+if __name__ == "__main__":
+    ingest(*sys.argv[1:3])
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from voice_registry import REGISTRY_FILE
+
+# Synthesized audio keyed by a hash of the full t2a_v2 request payload
+CACHE_DIR = os.path.abspath(".cache/tts")
+MAX_CACHE_BYTES = 2 * 1024 ** 3
+BYPASS_ENV = "TTS_CACHE_BYPASS" # Set to 1 to always call the API
+
+# Payload fields that do not change the audio bytes
+IGNORED_FIELDS = ("stream", "stream_options", "output_format")
+
+def payload_key(payload, clone=None):
+    # `clone` identifies the clone behind a cloned voice_id, so re-cloning a
+    # voice from a new reference clip gives its lines new keys
+    relevant = {k: v for k, v in payload.items() if k not in IGNORED_FIELDS}
+    if clone:
+        relevant["voice_clone"] = clone
+    blob = json.dumps(relevant, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+class TTSCache:
+    # On-disk content-addressed store with LRU eviction. A file's mtime is
+    # its last-use time, so recency survives restarts.
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, bypass=None, registry_file=REGISTRY_FILE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.bypass = os.getenv(BYPASS_ENV) == "1" if bypass is None else bypass
+        self.registry_file = registry_file
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total = None
+        self._clones = {}
+        self._clones_mtime = None
+
+    def path(self, key, ext="mp3"):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{ext}")
+
+    def _clone_params(self):
+        # Clone fingerprint (reference clip hash and model) per voice_id from
+        # the voice registry, reloaded whenever another process re-clones
+        try:
+            mtime = os.stat(self.registry_file).st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        if mtime != self._clones_mtime:
+            with open(self.registry_file, 'r', encoding='utf-8') as f:
+                voices = json.load(f).get("voices", {}) # Saved atomically, so never half-written
+            self._clones = {voice_id: entry.get("params") for voice_id, entry in voices.items()}
+            self._clones_mtime = mtime
+        return self._clones
+
+    def key(self, payload):
+        voice_id = (payload.get("voice_setting") or {}).get("voice_id")
+        return payload_key(payload, self._clone_params().get(voice_id))
+
+    def _payload_path(self, payload):
+        return self.path(self.key(payload), payload.get("audio_setting", {}).get("format", "mp3"))
+
+    def lookup(self, payload):
+        # Path of the cached audio, or None; counted as a hit or miss
+        if self.bypass:
+            return None
+        path = self._payload_path(payload)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def get(self, payload):
+        path = self.lookup(payload)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None # Evicted since the lookup
+
+    def put(self, payload, audio):
+        def write(tmp):
+            with open(tmp, 'wb') as f:
+                f.write(audio)
+        return self._store(payload, write)
+
+    def put_file(self, payload, source):
+        # Like put(), but copies an audio file in blocks instead of taking
+        # the bytes, so large outputs never sit in memory whole
+        return self._store(payload, lambda tmp: shutil.copyfile(source, tmp))
+
+    def _store(self, payload, write):
+        if self.bypass:
+            return None
+        path = self._payload_path(payload)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        write(tmp)
+        size = os.path.getsize(tmp)
+        os.replace(tmp, path)
+        with self._lock:
+            self._total = self._scan_size() if self._total is None else self._total + size
+            if self._total > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                full = os.path.join(root, name)
+                try:
+                    st = os.stat(full)
+                except FileNotFoundError:
+                    continue
+                yield st.st_mtime, st.st_size, full
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self, keep=None):
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, full in entries:
+            if total <= self.max_bytes:
+                break
+            if full == keep:
+                continue
+            try:
+                os.remove(full)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total = total
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bypass": self.bypass
+        }
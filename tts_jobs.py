@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+from functools import partial
+
+import metrics
+from minimax_client import MiniMaxClient, build_t2a_payload, thread_pool
+from tts_cache import TTSCache, payload_key
+
+# A job spec declares a matrix of voice x text x emotion x settings:
+#
+#   {
+#     "output_dir": "out/emotions",
+#     "filename": "{voice_id}_{emotion}_{index}.mp3",
+#     "rpm": 60, "concurrency": 4,
+#     "defaults": {"voice_id": "tim_clone_v1", "speed": 1},
+#     "matrix": {"text": ["..."], "emotion": ["happy", "sad"]},
+#     "items": [{"text": "...", "emotion": "calm"}]
+#   }
+#
+# Every combination of the matrix values plus every explicit item becomes
+# one request. Completed requests are appended to a checkpoint file in
+# output_dir, so re-running the same spec resumes where it stopped.
+DEFAULT_FILENAME = "{index:04d}_{voice_id}_{emotion}.mp3"
+DEFAULT_RPM = 60
+DEFAULT_CONCURRENCY = 4
+CHECKPOINT_FILE = ".checkpoint.jsonl"
+SETTING_KEYS = ("voice_id", "emotion", "speed", "vol", "pitch", "model", "audio_setting", "stream", "output_format")
+
+def load_spec(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith((".yaml", ".yml")):
+            import yaml # Only needed for YAML specs
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def expand(spec, cache=None):
+    # Item ids are cache keys, so re-cloning a voice also re-runs its items
+    key = cache.key if cache is not None else payload_key
+    defaults = spec.get("defaults", {})
+    combos = []
+    matrix = spec.get("matrix") or {}
+    if matrix:
+        keys = list(matrix)
+        for values in itertools.product(*(matrix[k] for k in keys)):
+            combos.append(dict(zip(keys, values)))
+    combos.extend(spec.get("items", []))
+
+    template = spec.get("filename", DEFAULT_FILENAME)
+    output_dir = spec.get("output_dir", ".")
+    items = []
+    for index, combo in enumerate(combos):
+        item = {**defaults, **combo}
+        settings = {k: item[k] for k in SETTING_KEYS if k in item}
+        payload = build_t2a_payload(item["text"], **{k: v for k, v in settings.items() if k != "stream"})
+        fields = {"emotion": "default", "voice_id": "voice", **item, "index": index,
+                  "key": key(payload)[:12]}
+        items.append({
+            "id": key(payload),
+            "text": item["text"],
+            "output": os.path.join(output_dir, template.format(**fields)),
+            **settings
+        })
+    return items
+
+class TokenBucket:
+    # Allows `rate_per_minute` acquisitions per minute with bursts of `burst`
+    def __init__(self, rate_per_minute, burst=1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def read_checkpoint(path):
+    done = set()
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["id"])
+                except (ValueError, KeyError):
+                    continue # A line cut short by a crash
+    return done
+
+async def run_items(client, items, checkpoint_path, rpm, concurrency):
+    bucket = TokenBucket(rpm, burst=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    pool = thread_pool(concurrency)
+    checkpoint = open(checkpoint_path, 'a', encoding='utf-8')
+    results = {"done": 0, "failed": 0}
+
+    async def run(item):
+        settings = {k: item[k] for k in SETTING_KEYS if k in item}
+        async with semaphore:
+            await bucket.acquire()
+            try:
+                await loop.run_in_executor(pool, partial(client.t2a_to_file, item["text"], item["output"], **settings))
+            except Exception as e:
+                results["failed"] += 1
+                print(f"Failed {item['output']}: {e}")
+                return
+            checkpoint.write(json.dumps({"id": item["id"], "output": item["output"], "at": time.time()}) + "\n")
+            checkpoint.flush()
+            results["done"] += 1
+            print(f"[{results['done']}/{len(items)}] {item['output']}")
+
+    try:
+        await asyncio.gather(*(run(item) for item in items))
+    finally:
+        checkpoint.close()
+        pool.shutdown(wait=False)
+    return results
+
+def run_spec(spec_path, client=None, rpm=None, concurrency=None):
+    spec = load_spec(spec_path)
+    cache = client.cache if client is not None and client.cache is not None else TTSCache()
+    items = expand(spec, cache)
+    output_dir = spec.get("output_dir", ".")
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+
+    done = read_checkpoint(checkpoint_path)
+    pending = [item for item in items if not (item["id"] in done and os.path.exists(item["output"]))]
+    print(f"{len(items)} items in spec, {len(items) - len(pending)} already done, {len(pending)} to run")
+    if not pending:
+        return {"done": 0, "failed": 0, "skipped": len(items)}
+
+    for item in pending:
+        os.makedirs(os.path.dirname(item["output"]) or ".", exist_ok=True)
+
+    if client is None:
+        client = MiniMaxClient(cache=cache)
+    start = time.perf_counter()
+    results = asyncio.run(run_items(
+        client, pending, checkpoint_path,
+        rpm or spec.get("rpm", DEFAULT_RPM),
+        concurrency or spec.get("concurrency", DEFAULT_CONCURRENCY)
+    ))
+    results["skipped"] = len(items) - len(pending)
+    print(f"Finished: {results['done']} done, {results['failed']} failed, {results['skipped']} skipped "
+          f"in {time.perf_counter() - start:.1f}s")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a declarative batch of T2A requests with resumable checkpoints")
+    parser.add_argument("spec", help="JSON or YAML job spec")
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute (overrides the spec)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Requests in flight (overrides the spec)")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the expanded items")
+    args = parser.parse_args()
+
+    if args.dry_run:
+        for item in expand(load_spec(args.spec), TTSCache()):
+            print(json.dumps(item, ensure_ascii=False))
+        return
+
+    run_spec(args.spec, rpm=args.rpm, concurrency=args.concurrency)
+
+if __name__ == "__main__":
+    with metrics.run("tts_jobs"):
+        main()
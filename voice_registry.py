@@ -0,0 +1,87 @@
+import json
+import os
+import threading
+import time
+
+from build_cache import file_hash, params_hash
+from minimax_client import DEFAULT_MODEL, MiniMaxError
+
+# Remembers which reference clips were already uploaded and which voices
+# were cloned from them, keyed by the clip's SHA-256. Changing the clip
+# changes the key, so stale file_ids and voices are never reused.
+REGISTRY_FILE = os.path.abspath(".cache/voice_registry.json")
+
+class VoiceRegistry:
+    def __init__(self, path=REGISTRY_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self.data = {"uploads": {}, "voices": {}}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def file_id(self, client, file_path, purpose="voice_clone", refresh=False):
+        key = f"{file_hash(file_path)}:{purpose}"
+        entry = self.data["uploads"].get(key)
+        if entry and not refresh:
+            print(f"Reusing upload of {file_path}: File ID {entry['file_id']}")
+            return entry["file_id"]
+
+        file_id = client.upload_file(file_path, purpose)
+        with self._lock:
+            self.data["uploads"][key] = {"file_id": file_id, "path": file_path, "uploaded_at": time.time()}
+            self.save()
+        return file_id
+
+    def ensure_voice(self, client, file_path, voice_id, text=None, model=DEFAULT_MODEL):
+        # Returns the clone response if a clone was made, or None if the voice
+        # already exists for this exact clip and model
+        sha = file_hash(file_path)
+        params = params_hash({"file_sha256": sha, "model": model})
+        entry = self.data["voices"].get(voice_id)
+        if entry and entry["params"] == params:
+            print(f"Voice {voice_id} is up to date, skipping clone")
+            return None
+
+        reused = f"{sha}:voice_clone" in self.data["uploads"]
+        file_id = self.file_id(client, file_path)
+        try:
+            result = client.voice_clone(file_id, voice_id, text, model)
+        except MiniMaxError:
+            if not reused:
+                raise
+            # A remembered file_id may have expired upstream; upload once more
+            file_id = self.file_id(client, file_path, refresh=True)
+            result = client.voice_clone(file_id, voice_id, text, model)
+
+        with self._lock:
+            self.data["voices"][voice_id] = {
+                "params": params,
+                "file_sha256": sha,
+                "file_id": file_id,
+                "path": file_path,
+                "model": model,
+                "cloned_at": time.time()
+            }
+            self.save()
+        return result
+
+    def voice_audio(self, client, file_path, voice_id, text, output_filename, **settings):
+        # Speech for `text` in the cloned voice: taken from the clone's demo
+        # audio when a clone was needed, otherwise synthesized with t2a
+        result = self.ensure_voice(client, file_path, voice_id, text)
+        if result is not None:
+            audio = client.audio_from_response(result)
+            with open(output_filename, "wb") as f:
+                f.write(audio)
+        else:
+            client.t2a_to_file(text, output_filename, voice_id=voice_id, **settings)
+        print(f"Saved {output_filename}")
+        return output_filename